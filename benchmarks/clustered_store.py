@@ -0,0 +1,75 @@
+"""
+Selective scans of the full store: month partitions written in _id order as
+single row groups, as before the store was clustered, read and then sorted
+by town as the app used to, against scan_dataframe over the clustered store
+with the predicate pushed into the reader.
+
+The unclustered copy is written to a temporary directory from the current
+partitions.
+
+    python -m benchmarks.clustered_store
+"""
+
+import tempfile
+from pathlib import Path
+
+import polars as pl
+
+from benchmarks.common import measure, report
+from webapp.read import (
+    get_enum_schema,
+    get_partition_path,
+    get_store_dir,
+    get_store_months,
+    scan_dataframe,
+)
+
+RUNS = 30
+
+PREDICATES = {
+    "town = BISHAN": pl.col("town") == "BISHAN",
+    "town and flat_type": (pl.col("town") == "BISHAN")
+    & (pl.col("flat_type") == "4 ROOM"),
+    "flat_type = EXECUTIVE": pl.col("flat_type") == "EXECUTIVE",
+    "full scan": None,
+}
+
+
+def write_unclustered(store_dir: Path, tmp_dir: Path) -> list[Path]:
+    """Copy every partition in _id order with polars' default parquet options."""
+    paths = []
+    for month in get_store_months():
+        source = get_partition_path(store_dir, f"{month:%Y-%m}")
+        path = get_partition_path(tmp_dir, f"{month:%Y-%m}")
+        path.parent.mkdir(parents=True)
+        pl.read_parquet(source).sort("_id").write_parquet(path)
+        paths.append(path)
+    return paths
+
+
+def scan_unclustered(paths: list[Path], predicate: pl.Expr = None) -> pl.DataFrame:
+    lf = pl.scan_parquet(paths)
+    if predicate is not None:
+        lf = lf.filter(predicate)
+    return lf.cast(get_enum_schema()).collect().sort(by="town")
+
+
+def main():
+    print(f"Scans of the full store, best and median of {RUNS} runs")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = write_unclustered(get_store_dir(), Path(tmp_dir))
+        for label, predicate in PREDICATES.items():
+            rows = scan_dataframe(predicate=predicate).collect().height
+            assert scan_unclustered(paths, predicate).height == rows
+            report(
+                f"{label}: unclustered",
+                measure(lambda: scan_unclustered(paths, predicate), RUNS),
+            )
+            report(
+                f"{label}: clustered",
+                measure(lambda: scan_dataframe(predicate=predicate).collect(), RUNS),
+            )
+
+
+if __name__ == "__main__":
+    main()
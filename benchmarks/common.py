@@ -0,0 +1,40 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from webapp.utils import get_project_root
+
+
+def measure(func, repeat: int = 7) -> list[float]:
+    """Run func repeat times and return the wall times in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(label: str, times: list[float]):
+    print(
+        f"  {label:<40} median {statistics.median(times):8.1f} ms"
+        f"   best {min(times):8.1f} ms"
+    )
+
+
+def run_fresh(code: str, cwd=None) -> dict:
+    """
+    Run code in a new interpreter from cwd (default: the project root) and
+    return the JSON object it prints last, so cold loads are not helped by
+    this process.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=cwd or get_project_root(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,45 @@
+"""
+The full history with the dictionary columns as plain strings, as the app
+loaded them before the store dictionary, against the pl.Enum columns
+scan_dataframe returns now.
+
+    python -m benchmarks.enum_columns
+"""
+
+import polars as pl
+
+from benchmarks.common import measure, report
+from webapp.read import scan_dataframe
+
+TOWNS = ["ANG MO KIO", "BISHAN", "TAMPINES"]
+
+QUERIES = {
+    "is_in(3 towns)": lambda df: df.filter(pl.col("town").is_in(TOWNS)),
+    "median by quarter, town": lambda df: df.group_by("quarter_label", "town").agg(
+        pl.median("resale_price")
+    ),
+    "median by quarter, lease": lambda df: df.group_by(
+        "quarter_label", "cat_remaining_lease_years"
+    ).agg(pl.median("resale_price")),
+    "street_name unique()": lambda df: df["street_name"].unique(),
+}
+
+
+def main():
+    enum_df = scan_dataframe().collect()
+    enums = [col for col, dtype in enum_df.schema.items() if isinstance(dtype, pl.Enum)]
+    utf8_df = enum_df.cast({col: pl.Utf8 for col in enums})
+    print(f"Full history, {enum_df.height} rows, {len(enums)} dictionary columns")
+
+    for label, df in [("Utf8", utf8_df), ("Enum", enum_df)]:
+        print(
+            f"  {label} estimated size: {df.estimated_size('mb'):.1f} MB "
+            f"(the {len(enums)} columns: {df.select(enums).estimated_size('mb'):.1f} MB)"
+        )
+    for query, func in QUERIES.items():
+        for label, df in [("Utf8", utf8_df), ("Enum", enum_df)]:
+            report(f"{query}: {label}", measure(lambda: func(df)))
+
+
+if __name__ == "__main__":
+    main()
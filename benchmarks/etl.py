@@ -0,0 +1,183 @@
+"""
+Time and peak RSS of the update pipeline on recorded data: a backfill of
+every month with a committed CSV into an empty data directory, then the same
+run again with nothing changed upstream.
+
+The datastore is a zero-latency local replay of datastore_search serving the
+committed CSVs, and the geocoding cache is seeded with their coordinates, so
+nothing goes to the network. Each run is a fresh process in a temporary copy
+of the project, and covers fetching, geocoding, the CSV writes and, when
+months changed, the store, snapshot and rollup rebuild.
+
+Pass the root of another checkout to benchmark its pipeline instead, e.g. a
+git worktree of the commit before the polars port:
+
+    python -m benchmarks.etl
+    python -m benchmarks.etl /path/to/other/checkout
+"""
+
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import polars as pl
+
+from benchmarks.common import run_fresh
+from webapp.utils import get_project_root
+
+RUNS = 3
+SUBDIR = "Resale Flat Prices"
+PROPERTY_INFO = Path("HDB Property Information") / "HDB Property Information.CSV"
+
+# columns of the datastore; the rest are added by the pipeline
+DATASTORE_COLUMNS = [
+    "_id",
+    "month",
+    "town",
+    "flat_type",
+    "block",
+    "street_name",
+    "storey_range",
+    "floor_area_sqm",
+    "flat_model",
+    "lease_commence_date",
+    "remaining_lease",
+    "resale_price",
+]
+
+SEED = """
+import json
+from contextlib import closing
+import polars as pl
+from webapp.update.geocache import connect, save_found
+records = pl.read_csv("{csvs}", infer_schema_length=0).select(
+    "address", "postal", pl.col("latitude", "longitude").cast(pl.Float64)
+).unique("address").to_dicts()
+with closing(connect()) as con:
+    save_found(con, records, "onemap")
+    con.commit()
+print(json.dumps({{"addresses": len(records)}}))
+"""
+
+RUN = """
+import json, re, time
+start = time.perf_counter()
+from webapp.update import datagov, extract
+datagov.BASE_SEARCH_URL = extract.BASE_SEARCH_URL = "{url}"
+changed = extract.extract({args})
+if changed:
+    from webapp.update.convert import csv_to_parquet, write_snapshot
+    from webapp.update.rollup import build_rollup
+    csv_to_parquet(months=changed)
+    write_snapshot()
+    build_rollup()
+elapsed = time.perf_counter() - start
+peak = int(re.search(r"VmHWM:\s+(\d+)", open("/proc/self/status").read())[1])
+print(json.dumps({{"s": elapsed, "rss_mb": peak / 1024, "changed": len(changed)}}))
+"""
+
+
+def load_records(data_dir: Path) -> dict[str, list[dict]]:
+    """The committed rows per month as the datastore returns them: strings, int _id."""
+    df = (
+        pl.read_csv(data_dir / "20*.csv", infer_schema_length=0)
+        .select(DATASTORE_COLUMNS)
+        .with_columns(pl.col("_id").cast(pl.Int64))
+        .sort("_id")
+    )
+    return {
+        month: part.to_dicts()
+        for (month,), part in df.partition_by("month", as_dict=True).items()
+    }
+
+
+def serve_datastore(records: dict[str, list[dict]]) -> ThreadingHTTPServer:
+    """Answer datastore_search queries filtered by month from records."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            month = json.loads(query.get("filters", "{}")).get("month")
+            rows = records.get(month, [])
+            if query.get("sort") == "_id desc":
+                rows = rows[::-1]
+            offset, limit = int(query.get("offset", 0)), int(query.get("limit", 100))
+            page = rows[offset : offset + limit]
+            if "fields" in query:
+                fields = query["fields"].split(",")
+                page = [{field: row[field] for field in fields} for row in page]
+            body = json.dumps(
+                {"success": True, "result": {"records": page, "total": len(rows)}}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_project(tree: Path, tmp_dir: Path) -> Path:
+    """Copy the tree's code and the property info into an empty project."""
+    shutil.copytree(
+        tree / "webapp",
+        tmp_dir / "webapp",
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    data_dir = tmp_dir / "data"
+    (data_dir / SUBDIR).mkdir(parents=True)
+    (data_dir / PROPERTY_INFO).parent.mkdir(parents=True)
+    shutil.copy(get_project_root() / "data" / PROPERTY_INFO, data_dir / PROPERTY_INFO)
+    return tmp_dir
+
+
+def report(label: str, results: list[dict]):
+    print(
+        f"  {label:<24} {statistics.median(r['s'] for r in results):5.1f} s, "
+        f"peak RSS {statistics.median(r['rss_mb'] for r in results):4.0f} MB, "
+        f"{results[0]['changed']} months rewritten"
+    )
+
+
+def main():
+    tree = Path(sys.argv[1]) if len(sys.argv) > 1 else get_project_root()
+    data_dir = get_project_root() / "data" / SUBDIR
+    records = load_records(data_dir)
+    months = sorted(records)
+    args = [months[0], months[-1], "-f", "--rate", "1000"]
+
+    server = serve_datastore(records)
+    url = f"http://127.0.0.1:{server.server_port}/api/action/datastore_search"
+    print(
+        f"ETL of {tree} over {len(months)} months ({months[0]} to {months[-1]}), "
+        f"median of {RUNS} processes"
+    )
+    backfills, reruns = [], []
+    try:
+        for _ in range(RUNS):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                root = make_project(tree, Path(tmp_dir))
+                run_fresh(SEED.format(csvs=data_dir / "20*.csv"), cwd=root)
+                run = RUN.format(url=url, args=args)
+                backfills.append(run_fresh(run, cwd=root))
+                reruns.append(run_fresh(run, cwd=root))
+    finally:
+        server.shutdown()
+    report("backfill (no CSVs)", backfills)
+    report("re-run, all unchanged", reruns)
+
+
+if __name__ == "__main__":
+    main()
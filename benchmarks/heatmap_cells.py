@@ -0,0 +1,131 @@
+"""
+Building the heatmap page's cells from the merged grid: colours, cell
+geometry and tooltip columns. "per-row" is the page before these were
+vectorised (plotly's sample_colorscale per cell, polygons and tooltips with
+pandas apply); "select" is the page now (get_color_lut, corners and
+format_number in one select).
+
+The grids are synthetic 50 m cells with the columns merge_grid returns.
+
+    python -m benchmarks.heatmap_cells
+"""
+
+import numpy as np
+import plotly.colors as pc
+import polars as pl
+
+from benchmarks.common import measure, report
+from webapp.heatmap import get_grid_degrees
+from webapp.utils import format_number, map_colors
+
+GRID_SIZE = 50
+CELL_COUNTS = [10_000, 50_000]
+RUNS = 3
+
+
+def make_grid(n: int, seed: int = 0) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    grid_degrees = get_grid_degrees(GRID_SIZE)
+    side = int(np.ceil(np.sqrt(n)))
+    cell = rng.permutation(side * side)[:n]
+    min_price = rng.uniform(150_000, 600_000, n)
+    return pl.DataFrame(
+        {
+            "lat_bin": 1.25 + (cell // side) * grid_degrees,
+            "lon_bin": 103.6 + (cell % side) * grid_degrees,
+            "avg_psf": rng.uniform(300, 1200, n),
+            "avg_price": min_price * rng.uniform(1, 1.5, n),
+            "max_price": min_price * rng.uniform(1.5, 2, n),
+            "min_price": min_price,
+            "avg_remaining_lease": rng.uniform(40, 95, n),
+            "mode_street": [f"STREET {i % 900}" for i in range(n)],
+            "count": rng.integers(1, 200, n).astype(np.uint32),
+        }
+    )
+
+
+def get_color_mapped(val, vmin, vmax, colorscale_name="Portland"):
+    """The page's colour of one cell before get_color_lut."""
+    norm_val = 0.5 if vmax == vmin else (val - vmin) / (vmax - vmin)
+    color_str = pc.sample_colorscale(colorscale_name, [norm_val])[0]
+    try:
+        if color_str.startswith("rgb"):
+            content = color_str.split("(")[1].split(")")[0]
+            parts = [float(x.strip()) for x in content.split(",")]
+            return [int(parts[0]), int(parts[1]), int(parts[2]), 180]
+        elif color_str.startswith("#"):
+            return list(pc.hex_to_rgb(color_str)) + [180]
+    except Exception:
+        pass
+    return [128, 128, 128, 180]
+
+
+def per_row_cells(agg_df: pl.DataFrame):
+    half_size = get_grid_degrees(GRID_SIZE) / 2
+    min_psf, max_psf = agg_df["avg_psf"].min(), agg_df["avg_psf"].max()
+
+    def get_polygon(row):
+        lat, lon = row["lat_bin"], row["lon_bin"]
+        return [
+            [lon - half_size, lat - half_size],
+            [lon + half_size, lat - half_size],
+            [lon + half_size, lat + half_size],
+            [lon - half_size, lat + half_size],
+        ]
+
+    pdf = agg_df.to_pandas()
+    pdf["color"] = pdf["avg_psf"].apply(lambda x: get_color_mapped(x, min_psf, max_psf))
+    pdf["polygon"] = pdf.apply(get_polygon, axis=1)
+    pdf["fmt_psf"] = pdf["avg_psf"].apply(lambda x: f"${x:,.2f}")
+    pdf["fmt_price"] = pdf["avg_price"].apply(lambda x: f"${x:,.0f}")
+    pdf["fmt_max_price"] = pdf["max_price"].apply(lambda x: f"${x:,.0f}")
+    pdf["fmt_min_price"] = pdf["min_price"].apply(lambda x: f"${x:,.0f}")
+    pdf["fmt_lease"] = pdf["avg_remaining_lease"].apply(lambda x: f"{x:.1f} yrs")
+    return pdf
+
+
+def select_cells(agg_df: pl.DataFrame) -> pl.DataFrame:
+    grid_size_deg = get_grid_degrees(GRID_SIZE)
+    min_psf, max_psf = agg_df["avg_psf"].min(), agg_df["avg_psf"].max()
+    corners = agg_df.select(
+        pl.col("lon_bin") - grid_size_deg / 2, pl.col("lat_bin") - grid_size_deg / 2
+    ).to_numpy()
+    colors = map_colors(agg_df["avg_psf"].to_numpy(), min_psf, max_psf)
+    return agg_df.select(
+        pl.Series("lon", corners[:, 0]),
+        pl.Series("lat", corners[:, 1]),
+        pl.Series("r", colors[:, 0]),
+        pl.Series("g", colors[:, 1]),
+        pl.Series("b", colors[:, 2]),
+        "mode_street",
+        "count",
+        format_number(pl.col("avg_psf"), 2).alias("fmt_psf"),
+        format_number(pl.col("avg_price")).alias("fmt_price"),
+        format_number(pl.col("max_price")).alias("fmt_max_price"),
+        format_number(pl.col("min_price")).alias("fmt_min_price"),
+        format_number(pl.col("avg_remaining_lease"), 1).alias("fmt_lease"),
+    )
+
+
+def check(agg_df: pl.DataFrame):
+    """The two paths agree: same tooltips and corners, colours within the LUT's step."""
+    before, after = per_row_cells(agg_df), select_cells(agg_df)
+    assert (before["fmt_psf"] == "$" + after["fmt_psf"].to_pandas()).all()
+    assert (before["fmt_lease"] == after["fmt_lease"].to_pandas() + " yrs").all()
+    corners = np.array([polygon[0] for polygon in before["polygon"]])
+    assert np.allclose(corners, after.select("lon", "lat").to_numpy())
+    colors = np.array(before["color"].tolist())[:, :3]
+    assert np.abs(colors - after.select("r", "g", "b").to_numpy()).max() <= 2
+
+
+def main():
+    check(make_grid(2_000))
+    print(f"Cells of {GRID_SIZE} m grids, best and median of {RUNS} runs")
+    for n in CELL_COUNTS:
+        agg_df = make_grid(n)
+        report(f"{n} cells: per-row", measure(lambda: per_row_cells(agg_df), RUNS))
+        report(f"{n} cells: select", measure(lambda: select_cells(agg_df), RUNS))
+
+
+if __name__ == "__main__":
+    main()
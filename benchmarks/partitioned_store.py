@@ -0,0 +1,88 @@
+"""
+Cold load of the default 12-month window: the whole history in one parquet
+file read and then filtered by month, as before the partitioned store,
+against scan_dataframe over the window's month partitions.
+
+Each load runs in a fresh process. Times and RSS growth exclude imports.
+
+    python -m benchmarks.partitioned_store
+"""
+
+import statistics
+import tempfile
+from pathlib import Path
+
+import polars as pl
+from dateutil.relativedelta import relativedelta
+
+from benchmarks.common import run_fresh
+from webapp.read import get_store_months, scan_dataframe
+
+RUNS = 5
+
+LOAD = """
+import json, os, time
+from datetime import date
+import polars as pl
+{imports}
+def rss():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+start_date, end_date = date.fromisoformat("{start}"), date.fromisoformat("{end}")
+before = rss()
+start = time.perf_counter()
+df = {load}
+elapsed = time.perf_counter() - start
+grown = rss() - before
+print(json.dumps({{"ms": elapsed * 1000, "rss_mb": grown / 2**20, "rows": df.height}}))
+"""
+
+SINGLE_FILE = (
+    'pl.read_parquet("{path}").filter('
+    'pl.col("month").is_between(start_date, end_date))'
+)
+PARTITIONED = "scan_dataframe(start_date, end_date).collect()"
+
+
+def run(label: str, imports: str, load: str, start, end):
+    code = LOAD.format(imports=imports, load=load, start=start, end=end)
+    results = [run_fresh(code) for _ in range(RUNS)]
+    print(
+        f"  {label:<36} {statistics.median(r['ms'] for r in results):6.1f} ms, "
+        f"RSS +{statistics.median(r['rss_mb'] for r in results):.0f} MB, "
+        f"{results[0]['rows']} rows"
+    )
+
+
+def main():
+    months = get_store_months()
+    end = months[-1]
+    start = end - relativedelta(months=11)
+    print(f"Cold load of {start:%Y-%m}..{end:%Y-%m}, median of {RUNS} processes")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # the single file the app used to read, with plain string columns
+        path = Path(tmp_dir) / "df.parquet"
+        df = scan_dataframe().collect()
+        enums = [col for col, dtype in df.schema.items() if isinstance(dtype, pl.Enum)]
+        df = df.cast({col: pl.Utf8 for col in enums})
+        df.write_parquet(path)
+
+        run(
+            "read_parquet(df.parquet) + filter",
+            "",
+            SINGLE_FILE.format(path=path),
+            start,
+            end,
+        )
+    run(
+        "scan_dataframe(...).collect()",
+        "from webapp.read import scan_dataframe",
+        PARTITIONED,
+        start,
+        end,
+    )
+
+
+if __name__ == "__main__":
+    main()
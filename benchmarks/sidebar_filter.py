@@ -0,0 +1,131 @@
+"""
+One rerun of SidebarFilter with its widgets at their defaults, for the
+sidebars of the trend, PSF trend and heatmap pages. The source frame is
+already in memory, as it is in the app: the full history, and the full
+history concatenated 10 times for a dataset 10x the size.
+
+"eager" filters a DataFrame after every widget with that widget's
+selection and reads the next widget's options from it, as SidebarFilter did
+before FilterSpec; "lazy" is SidebarFilter as it is now, one lazy plan
+collected once. Streamlit runs bare, so widgets return their defaults.
+
+    python -m benchmarks.sidebar_filter
+"""
+
+from datetime import date
+
+import polars as pl
+import streamlit as st
+from dateutil.relativedelta import relativedelta
+from streamlit.logger import set_log_level
+
+from benchmarks.common import measure, report
+from webapp.filter import SidebarFilter
+from webapp.read import load_dataframe
+
+SCALES = [1, 10]
+
+PAGES = {
+    "trend": dict(
+        min_date=date(2017, 1, 1),
+        select_towns=(True, "multi"),
+        select_storey=True,
+    ),
+    "psf": dict(
+        min_date=date(2020, 1, 1),
+        select_towns=(True, "multi"),
+        select_street=True,
+        select_storey=True,
+        default_town="ANG MO KIO",
+        columns=["month", "psf", "remaining_lease_years", "address", "storey_range"],
+    ),
+    "heatmap": dict(
+        select_towns=(False, "single"),
+        columns=[
+            "month",
+            "flat_type",
+            "latitude",
+            "longitude",
+            "psf",
+            "resale_price",
+            "remaining_lease_years",
+            "street_name",
+        ],
+    ),
+}
+
+
+def eager_filter(
+    df: pl.DataFrame,
+    min_date: date = None,
+    select_towns=(True, "single"),
+    select_street=False,
+    select_storey=False,
+    default_town=None,
+    columns=None,
+) -> pl.DataFrame:
+    """The earlier SidebarFilter: filter after every widget, options from the result."""
+    start_date, end_date = st.sidebar.slider(
+        "Select date range",
+        min_value=df["month"].min(),
+        max_value=df["month"].max(),
+        value=(min_date or date.today() - relativedelta(months=12), date.today()),
+    )
+    df = df.filter(pl.col("month").is_between(start_date, end_date))
+
+    flat_types = ["ALL"] + sorted(df["flat_type"].unique())
+    flat_type = st.sidebar.selectbox("Select flat type", flat_types)
+    if flat_type != "ALL":
+        df = df.filter(pl.col("flat_type") == flat_type)
+
+    if select_towns[0]:
+        towns = st.sidebar.multiselect(
+            "Select town(s)",
+            options=sorted(df["town"].unique()),
+            default=[default_town] if default_town else None,
+        )
+        if towns:
+            df = df.filter(pl.col("town").is_in(towns))
+
+    if select_street:
+        streets = st.sidebar.multiselect(
+            "Select street(s)", options=sorted(df["street_name"].unique())
+        )
+        if streets:
+            df = df.filter(pl.col("street_name").is_in(streets))
+
+    if select_storey:
+        bounds = (
+            int(df["storey_lower_bound"].min()),
+            int(df["storey_lower_bound"].max()),
+        )
+        storey = st.sidebar.slider("Select storey range", *bounds, value=bounds)
+        df = df.filter(pl.col("storey_lower_bound").is_between(*storey))
+
+    bounds = (
+        int(df["remaining_lease_years"].min()),
+        int(df["remaining_lease_years"].max()),
+    )
+    lease = st.sidebar.slider("Select remaining lease years", *bounds, value=bounds)
+    return df.filter(pl.col("remaining_lease_years").is_between(*lease))
+
+
+def main():
+    # bare mode warns about the missing runtime on every widget; the level is
+    # set after the first widget has loaded streamlit's config
+    st.sidebar.empty()
+    set_log_level("error")
+    df = load_dataframe()
+    for scale in SCALES:
+        scaled = pl.concat([df] * scale).sort("month")
+        print(f"One SidebarFilter rerun over {scaled.height} rows ({scale}x), 7 runs")
+        for page, config in PAGES.items():
+            eager = eager_filter(scaled, **config)
+            lazy = SidebarFilter(df=scaled, **config).df
+            assert lazy.height == eager.height
+            report(f"{page}: eager", measure(lambda: eager_filter(scaled, **config)))
+            report(f"{page}: lazy", measure(lambda: SidebarFilter(df=scaled, **config)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+SUBDIR = "Resale Flat Prices"
+
+
+@pytest.fixture(scope="session")
+def snapshot():
+    """Build the store, snapshot and rollup from the committed CSVs if missing."""
+    from webapp.update.build import ensure_dataset
+
+    ensure_dataset(SUBDIR)
+
+
+class StubServer:
+    """
+    A local HTTP server answering GETs with respond(path, query, headers),
+    which returns (status, headers, body). Every request is kept in requests.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query))
+                stub.requests.append((url.path, query, dict(self.headers)))
+                status, headers, body = stub.respond(url.path, query, self.headers)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if "Content-Length" not in headers:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub_server():
+    """Start StubServer(respond) instances that are shut down after the test."""
+    servers = []
+
+    def start(respond) -> StubServer:
+        servers.append(StubServer(respond))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.server.shutdown()
+        server.server.server_close()
@@ -0,0 +1,82 @@
+import math
+
+import polars as pl
+import pytest
+
+from webapp.update.address import (
+    build_address_index,
+    get_street_key,
+    match_address,
+    normalise_address,
+)
+from webapp.utils import get_project_root
+
+PROPERTY_INFO = (
+    get_project_root()
+    / "data"
+    / "HDB Property Information"
+    / "HDB Property Information.CSV"
+)
+
+# a match further away than this is to a different block
+MAX_MATCH_DISTANCE = 100  # metres
+
+
+@pytest.fixture(scope="module")
+def located():
+    """The located property info addresses as {address: (latitude, longitude)}."""
+    df = (
+        pl.read_csv(
+            PROPERTY_INFO,
+            columns=["address", "latitude", "longitude"],
+            schema_overrides={"latitude": pl.Float64, "longitude": pl.Float64},
+            null_values=["nan"],
+        )
+        .drop_nulls()
+        .unique(subset="address", maintain_order=True)
+    )
+    return {address: (lat, lon) for address, lat, lon in df.iter_rows()}
+
+
+def get_distance(a: tuple[float, float], b: tuple[float, float]) -> float:
+    dy = (a[0] - b[0]) * 111000
+    dx = (a[1] - b[1]) * 111000 * math.cos(math.radians(a[0]))
+    return math.hypot(dx, dy)
+
+
+def test_left_out_addresses_do_not_match_another_block(located):
+    # every address is matched against all the others: any match has to be
+    # the same place spelled differently
+    index = build_address_index(list(located))
+    wrong = []
+    for address in located:
+        normalised = normalise_address(address)
+        block, _, street = normalised.partition(" ")
+        candidates = index["by_block"][block, get_street_key(street)]
+        entry = next(entry for entry in candidates if entry[1] == address)
+        known = index["exact"].pop(normalised)
+        candidates.remove(entry)
+
+        match = match_address(index, address)
+
+        candidates.append(entry)
+        index["exact"][normalised] = known
+        if (
+            match
+            and get_distance(located[address], located[match]) > MAX_MATCH_DISTANCE
+        ):
+            wrong.append((address, match))
+    assert wrong == []
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("Blk 5 Upper Boon Keng Road", "5 UPP BOON KENG RD"),
+        ("5 BOON KENG ROAD", "5 BOON KENG RD"),
+        ("5 UPP BOON KENG RF", "5 UPP BOON KENG RD"),
+        ("5 BON KENG RD", "5 BOON KENG RD"),
+    ],
+)
+def test_spelling_variants_match(located, address, expected):
+    assert match_address(build_address_index(list(located)), address) == expected
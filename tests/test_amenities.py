@@ -0,0 +1,20 @@
+import polars as pl
+
+from webapp.amenities import get_amenity_path
+from webapp.update import amenities
+from webapp.utils import get_file_version
+
+
+def test_unlocated_schools_do_not_overwrite_amenities(snapshot, monkeypatch):
+    # a geocoder that finds nothing leaves the primary school layer empty
+    monkeypatch.setattr(
+        amenities,
+        "get_map_results",
+        lambda addresses: addresses.with_columns(
+            latitude=pl.lit(None, pl.Float64), longitude=pl.lit(None, pl.Float64)
+        ),
+    )
+    version = get_file_version(get_amenity_path())
+
+    assert amenities.build_amenities() is None
+    assert get_file_version(get_amenity_path()) == version
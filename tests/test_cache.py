@@ -0,0 +1,61 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from webapp import cache
+from webapp.filter import FilterSpec
+
+
+@pytest.fixture
+def cached():
+    """A spec_cache'd function returning a 1,000-row frame per spec, on an empty cache."""
+    cache.clear_cache()
+    yield cache.spec_cache(get_rows)
+    cache.clear_cache()
+
+
+def get_rows(spec: FilterSpec) -> pl.DataFrame:
+    return pl.DataFrame({"value": range(1000)}).with_columns(
+        month=pl.lit(spec.start_date)
+    )
+
+
+def get_spec(month: int) -> FilterSpec:
+    return FilterSpec(date(2024, month, 1), date(2024, 12, 1))
+
+
+def get_counts(before: dict) -> dict:
+    stats = cache.get_cache_stats()
+    return {
+        key: stats[key] - before.get(key, 0)
+        for key in ("hits", "misses", "evictions", "entries")
+    }
+
+
+def test_entry_budget_evicts_least_recently_used(cached, monkeypatch):
+    monkeypatch.setattr(cache, "RESULT_CACHE_MAX_ENTRIES", 2)
+    before = {**cache.get_cache_stats(), "entries": 0}
+
+    first = cached(get_spec(1))
+    cached(get_spec(2))
+    assert cached(get_spec(1)) is first
+    cached(get_spec(3))  # evicts month 2, used longest ago
+    assert get_counts(before) == {"hits": 1, "misses": 3, "evictions": 1, "entries": 2}
+
+    assert cached(get_spec(1)) is first
+    cached(get_spec(2))
+    assert get_counts(before) == {"hits": 2, "misses": 4, "evictions": 2, "entries": 2}
+
+
+def test_byte_budget_bounds_the_cache(cached, monkeypatch):
+    size = cache.get_result_size(get_rows(get_spec(1)))
+    monkeypatch.setattr(cache, "RESULT_CACHE_MAX_BYTES", size * 2 + size // 2)
+    before = {**cache.get_cache_stats(), "entries": 0}
+
+    for month in range(1, 6):
+        cached(get_spec(month))
+
+    stats = cache.get_cache_stats()
+    assert get_counts(before) == {"hits": 0, "misses": 5, "evictions": 3, "entries": 2}
+    assert stats["bytes"] == size * 2 <= cache.RESULT_CACHE_MAX_BYTES
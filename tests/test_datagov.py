@@ -0,0 +1,143 @@
+import hashlib
+import json
+
+import pytest
+import requests
+
+from webapp.update import datagov, httpcache
+
+
+class Datastore:
+    """A datastore_search endpoint serving records with an ETag per page."""
+
+    def __init__(self, records: int, max_limit: int = 1000):
+        self.records = [{"_id": i + 1, "month": "2024-01"} for i in range(records)]
+        self.max_limit = max_limit
+
+    def __call__(self, path, query, headers):
+        offset = int(query.get("offset", 0))
+        limit = min(int(query["limit"]), self.max_limit)
+        body = json.dumps(
+            {
+                "success": True,
+                "result": {
+                    "records": self.records[offset : offset + limit],
+                    "total": len(self.records),
+                },
+            }
+        ).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "application/json"}, body
+
+
+@pytest.fixture
+def datastore(stub_server, monkeypatch, tmp_path):
+    """Point the datastore API and the response cache at a stub and a temp dir."""
+
+    def start(records: int, max_limit: int = 1000):
+        store = Datastore(records, max_limit)
+        server = stub_server(store)
+        monkeypatch.setattr(datagov, "BASE_SEARCH_URL", server.url + "/search")
+        return store, server
+
+    monkeypatch.setattr(httpcache, "CACHE_DIR", tmp_path)
+    return start
+
+
+def get_offsets(server) -> list[int]:
+    return [int(query["offset"]) for _, query, _ in server.requests]
+
+
+def test_every_page_is_fetched_in_order(datastore):
+    store, server = datastore(250)
+
+    records = datagov.fetch_data_gov_sg("d_test", {"limit": 100})
+
+    assert records == store.records
+    assert sorted(get_offsets(server)) == [0, 100, 200]
+
+
+def test_pages_follow_a_capped_page_size(datastore):
+    store, server = datastore(250, max_limit=100)
+
+    records = datagov.fetch_data_gov_sg("d_test")
+
+    assert records == store.records
+    assert sorted(get_offsets(server)) == [0, 100, 200]
+
+
+def test_stale_cached_pages_are_refetched(datastore):
+    store, server = datastore(250)
+    datagov.fetch_data_gov_sg("d_test", {"limit": 100})
+
+    # the first page expires and reports fewer records than the cached rest
+    del store.records[180:]
+    first_page = httpcache.get_cache_key(
+        datagov.BASE_SEARCH_URL,
+        {"resource_id": "d_test", "limit": 100, "offset": 0},
+    )
+    (httpcache.CACHE_DIR / f"{first_page}.json").write_text(
+        json.dumps({"fetched_at": 0, "etag": None, "last_modified": None})
+    )
+    server.requests.clear()
+
+    records = datagov.fetch_data_gov_sg("d_test", {"limit": 100})
+
+    assert records == store.records
+    # page 0 from the server, page 100 from the cache, then both revalidated
+    assert get_offsets(server) == [0, 0, 100]
+
+
+def test_expired_pages_are_revalidated_with_their_etag(datastore):
+    store, server = datastore(50)
+    params = {"resource_id": "d_test", "limit": 100}
+    datagov.fetch_all_pages(params)
+    assert len(server.requests) == 1
+    before = httpcache.get_cache_stats()
+
+    assert datagov.fetch_all_pages(params, ttl=0) == (store.records, 50)
+
+    (_, _, first), (_, _, second) = server.requests
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"].strip('"')
+    after = httpcache.get_cache_stats()
+    assert after["revalidated"] == before["revalidated"] + 1
+    assert after["fetched"] == before["fetched"]
+
+
+def test_part_file_without_etag_is_not_resumed(stub_server, tmp_path):
+    content = b"resale,price\n" * 1000
+    server = stub_server(lambda path, query, headers: (200, {}, content))
+    output_file = tmp_path / "data.csv"
+    (tmp_path / "data.csv.part").write_bytes(b"stale bytes")
+
+    sha256 = datagov.stream_download(requests.Session(), server.url, output_file)
+
+    assert output_file.read_bytes() == content
+    assert sha256 == hashlib.sha256(content).hexdigest()
+    ((_, _, headers),) = server.requests
+    assert "Range" not in headers
+
+
+def test_416_on_the_last_attempt_raises(stub_server, tmp_path, monkeypatch):
+    content = b"resale,price\n" * 1000
+
+    def respond(path, query, headers):
+        if headers.get("Range"):
+            return 416, {}, b""
+        # the connection drops halfway through the body
+        return 200, {"ETag": '"v1"', "Content-Length": str(len(content))}, content[:500]
+
+    server = stub_server(respond)
+    monkeypatch.setattr(datagov, "DOWNLOAD_RETRIES", 2)
+    monkeypatch.setattr(datagov, "CHUNK_SIZE", 100)
+    monkeypatch.setattr(datagov.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(requests.RequestException, match="in 2 attempts"):
+        datagov.stream_download(requests.Session(), server.url, tmp_path / "data.csv")
+    assert [headers.get("If-Range") for _, _, headers in server.requests] == [
+        None,
+        '"v1"',
+    ]
@@ -0,0 +1,129 @@
+import json
+import shutil
+import threading
+import time
+
+import polars as pl
+
+from webapp.update import datagov, extract, httpcache
+from webapp.update.manifest import MANIFEST_FILE, load_manifest
+from webapp.utils import get_project_root
+
+MONTHS = ["2024-01", "2024-02", "2024-03"]
+
+# columns of the datastore; the rest are added by process_month
+DATASTORE_COLUMNS = [
+    "_id",
+    "month",
+    "town",
+    "flat_type",
+    "block",
+    "street_name",
+    "storey_range",
+    "floor_area_sqm",
+    "flat_model",
+    "lease_commence_date",
+    "remaining_lease",
+    "resale_price",
+]
+
+
+def test_revised_months_from_a_first_scan(stub_server, monkeypatch, tmp_path):
+    # CSVs but no manifest yet, as on the first run with --scan
+    data_dir = tmp_path / "Resale Flat Prices"
+    data_dir.mkdir()
+    probes = {}
+    for month in MONTHS:
+        source = get_project_root() / "data" / "Resale Flat Prices" / f"{month}.csv"
+        shutil.copy(source, data_dir)
+        ids = pl.read_csv(source, columns=["_id"])["_id"]
+        probes[month] = {"total": len(ids), "max_id": ids.max()}
+    # one month gained a row upstream, another cannot be probed
+    probes["2024-02"] = {"total": probes["2024-02"]["total"] + 1, "max_id": 10**9}
+    probes["2024-03"] = None
+
+    def respond(path, query, headers):
+        probe = probes[json.loads(query["filters"])["month"]]
+        if probe is None:
+            return 503, {}, b""
+        result = {"records": [{"_id": probe["max_id"]}], "total": probe["total"]}
+        return 200, {}, {"success": True, "result": result}
+
+    server = stub_server(respond)
+    monkeypatch.setattr(datagov, "BASE_SEARCH_URL", server.url + "/search")
+    monkeypatch.setattr(datagov.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(httpcache, "CACHE_DIR", tmp_path / "cache")
+
+    revised = extract.find_revised_months(MONTHS, data_dir, workers=2)
+
+    assert revised == ["2024-02"]
+    assert sorted(load_manifest(data_dir / MANIFEST_FILE)) == MONTHS
+
+
+class RecordedDatastore:
+    """
+    Replay the committed CSVs of months through datastore_search, a page of at
+    most page_size records taking delay seconds, and count requests in flight.
+    """
+
+    def __init__(self, months: list[str], page_size: int = 500, delay=0.02):
+        data_dir = get_project_root() / "data" / "Resale Flat Prices"
+        self.records = {
+            month: pl.read_csv(data_dir / f"{month}.csv", infer_schema_length=0)
+            .select(DATASTORE_COLUMNS)
+            .with_columns(pl.col("_id").cast(pl.Int64))
+            .to_dicts()
+            for month in months
+        }
+        self.page_size = page_size
+        self.delay = delay
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, path, query, headers):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        rows = self.records[json.loads(query["filters"])["month"]]
+        offset = int(query["offset"])
+        limit = min(int(query["limit"]), self.page_size)
+        result = {"records": rows[offset : offset + limit], "total": len(rows)}
+        with self.lock:
+            self.in_flight -= 1
+        return 200, {}, {"success": True, "result": result}
+
+
+def test_months_are_fetched_concurrently_within_the_host_limit(
+    stub_server, monkeypatch, tmp_path
+):
+    datastore = RecordedDatastore(MONTHS)
+    server = stub_server(datastore)
+    url = server.url + "/search"
+    monkeypatch.setattr(datagov, "BASE_SEARCH_URL", url)
+    monkeypatch.setattr(extract, "BASE_SEARCH_URL", url)
+    monkeypatch.setattr(httpcache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+
+    processed = {}
+
+    def process_month(month, data_dir, should_process=False, new_data=None):
+        # how many requests the datastore had served when the month came in
+        processed[month] = (new_data, len(server.requests))
+        return True
+
+    monkeypatch.setattr(extract, "process_month", process_month)
+
+    changed = extract.extract(
+        [MONTHS[0], MONTHS[-1], "-f", "--concurrency", "2", "--rate", "1000"]
+    )
+
+    assert changed == MONTHS
+    assert datastore.max_in_flight == 2
+    for month, (new_data, _) in processed.items():
+        expected = pl.DataFrame(datastore.records[month])
+        assert new_data.select(DATASTORE_COLUMNS).equals(expected)
+    # the first month done is processed while the others are still downloading
+    first_month = next(iter(processed.values()))
+    assert first_month[1] < len(server.requests)
@@ -0,0 +1,58 @@
+from contextlib import closing
+
+import pytest
+
+from webapp.update.geocache import connect, lookup, match_locally, save_found
+
+
+@pytest.fixture
+def con(tmp_path):
+    with closing(connect(tmp_path / "geocode.sqlite")) as con:
+        save_found(
+            con,
+            [
+                {
+                    "address": "5 UPP BOON KENG RD",
+                    "postal": "380005",
+                    "latitude": 1.3146,
+                    "longitude": 103.8705,
+                }
+            ],
+            "property_info",
+        )
+        yield con
+
+
+def test_matched_address_is_rechecked_when_due(con):
+    matched, unmatched = match_locally(con, ["5 UPPER BOON KENG ROAD"])
+    assert matched["latitude"].to_list() == [1.3146] and unmatched == []
+
+    found, pending = lookup(con, ["5 UPPER BOON KENG ROAD"])
+    assert found.height == 1 and pending == []
+
+    con.execute("UPDATE geocode SET retry_after = 0 WHERE source = 'matched'")
+    found, pending = lookup(con, ["5 UPPER BOON KENG ROAD"])
+    # the matched coordinates are kept until the geocoder answers
+    assert found.height == 1 and pending == ["5 UPPER BOON KENG ROAD"]
+    # and the address goes to the geocoder instead of being matched again
+    matched, unmatched = match_locally(con, pending)
+    assert matched.is_empty() and unmatched == ["5 UPPER BOON KENG ROAD"]
+
+    save_found(
+        con,
+        [
+            {
+                "address": "5 UPPER BOON KENG ROAD",
+                "postal": "380005",
+                "latitude": 1.3146,
+                "longitude": 103.8705,
+            }
+        ],
+        "onemap",
+    )
+    assert lookup(con, ["5 UPPER BOON KENG ROAD"])[1] == []
+
+
+def test_qualifiers_must_agree(con):
+    matched, unmatched = match_locally(con, ["5 BOON KENG RD"])
+    assert matched.is_empty() and unmatched == ["5 BOON KENG RD"]
@@ -0,0 +1,90 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from webapp.update import geocoding
+from webapp.update.ratelimit import configure_host, get_host_limit
+
+FOUND = {"results": [{"POSTAL": "560123", "LATITUDE": "1.35", "LONGITUDE": "103.85"}]}
+
+
+class Provider:
+    """A OneMap search endpoint answering with the given statuses in turn, then 200."""
+
+    def __init__(self, statuses=(), delay: float = 0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, path, query, headers):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            status = self.statuses.pop(0) if self.statuses else 200
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return status, {"Content-Type": "application/json"}, FOUND
+
+
+def start_provider(stub_server, monkeypatch, provider, concurrency=4, rate=1000.0):
+    server = stub_server(provider)
+    monkeypatch.setattr(geocoding, "ONEMAP_SEARCH_URL", server.url + "/search")
+    configure_host(urlparse(server.url).netloc, concurrency, rate)
+    return server
+
+
+def test_throttled_and_failed_requests_are_retried(stub_server, monkeypatch):
+    server = start_provider(stub_server, monkeypatch, Provider([429, 503, 502]))
+    monkeypatch.setattr(geocoding, "GEOCODE_RETRIES", 4)
+    monkeypatch.setattr(geocoding.time, "sleep", lambda seconds: None)
+
+    with requests.Session() as session:
+        results, errors = geocoding.geocode(["1 TEST RD"], session)
+
+    assert errors == []
+    assert results[0]["latitude"] == "1.35"
+    assert len(server.requests) == 4
+
+
+def test_address_is_given_up_after_the_retries(stub_server, monkeypatch):
+    server = start_provider(stub_server, monkeypatch, Provider([500] * 4))
+    monkeypatch.setattr(geocoding, "GEOCODE_RETRIES", 4)
+    monkeypatch.setattr(geocoding.time, "sleep", lambda seconds: None)
+
+    with requests.Session() as session:
+        results, errors = geocoding.geocode(["1 TEST RD"], session)
+
+    assert results == []
+    assert errors == ["1 TEST RD"]
+    assert len(server.requests) == 4
+
+
+def test_requests_stay_within_the_host_limits(stub_server, monkeypatch):
+    provider = Provider(delay=0.02)
+    start_provider(stub_server, monkeypatch, provider, concurrency=2, rate=20.0)
+    addresses = [f"{block} TEST RD" for block in range(12)]
+
+    start = time.monotonic()
+    with requests.Session() as session:
+        results, errors = geocoding.geocode(addresses, session)
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 12 and errors == []
+    assert provider.max_in_flight <= 2
+    # a burst of 2, then the other 10 at 20 per second
+    assert elapsed >= 10 / 20 * 0.9
+
+
+def test_geocode_keeps_the_provider_limits(stub_server, monkeypatch):
+    start_provider(stub_server, monkeypatch, Provider())
+    limits = [get_host_limit(url) for url in geocoding.PROVIDER_LIMITS]
+
+    with requests.Session() as session:
+        geocoding.geocode(["1 TEST RD"], session)
+
+    assert [get_host_limit(url) for url in geocoding.PROVIDER_LIMITS] == limits
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from webapp.filter import FilterSpec
+from webapp.heatmap import (
+    GRID_SIZES,
+    aggregate_grid,
+    merge_grid,
+    query_grid,
+    summarize_grid,
+    summarize_streets,
+)
+from webapp.read import load_dataframe
+
+COLUMNS = [
+    "month",
+    "flat_type",
+    "latitude",
+    "longitude",
+    "psf",
+    "resale_price",
+    "remaining_lease_years",
+    "street_name",
+]
+
+SPECS = [
+    # whole years, months on either side, and a lease range the rows fit
+    FilterSpec(date(2017, 1, 1), date(2024, 12, 1)),
+    FilterSpec(date(2020, 3, 1), date(2022, 7, 1), flat_type="4 ROOM"),
+    FilterSpec(date(2024, 1, 1), date(2024, 12, 1), lease_years=(40, 99)),
+]
+
+
+@pytest.mark.parametrize("grid_size", GRID_SIZES)
+@pytest.mark.parametrize("spec", SPECS)
+def test_pyramid_matches_binning_the_rows(snapshot, spec, grid_size):
+    df = load_dataframe(spec.start_date, spec.end_date).filter(spec.to_expr())
+    df = df.select(COLUMNS)
+    assert query_grid(spec, grid_size) is not None
+
+    served = aggregate_grid(spec, df, grid_size).sort("lat_bin", "lon_bin")
+    binned = merge_grid(
+        summarize_grid(df.lazy(), grid_size).collect(),
+        summarize_streets(df.lazy(), grid_size).collect(),
+        grid_size,
+    ).sort("lat_bin", "lon_bin")
+
+    assert served.select("lat_bin", "lon_bin", "count").equals(
+        binned.select("lat_bin", "lon_bin", "count")
+    )
+    for column in ["avg_psf", "avg_price", "avg_remaining_lease"]:
+        assert (served[column] - binned[column]).abs().max() < 1e-6
+    assert served["min_price"].equals(binned["min_price"])
+    assert served["max_price"].equals(binned["max_price"])
+    # streets are the cell's most frequent over the whole history
+    assert served["mode_street"].null_count() == 0
@@ -0,0 +1,110 @@
+import random
+from datetime import date
+
+import polars as pl
+import pytest
+
+from webapp import rollup
+from webapp.filter import FilterSpec
+from webapp.read import get_store_months, load_dataframe
+from webapp.rollup import (
+    SKETCH_ACCURACY,
+    SKETCH_METRICS,
+    aggregate,
+    get_rollup_path,
+    get_sketch_path,
+    load_cube,
+    query_rollup,
+)
+from webapp.update.rollup import build_rollup
+from webapp.utils import BUILD_ID, get_build_id
+
+GROUPINGS = [
+    ["quarter_label"],
+    ["quarter_label", "flat_type"],
+    ["quarter_label", "town"],
+    ["town"],
+]
+
+
+def get_random_spec(rng: random.Random, df: pl.DataFrame) -> FilterSpec:
+    """A spec on whole quarters, which the rollup can always answer."""
+    quarters = sorted(
+        {date(m.year, m.month - (m.month - 1) % 3, 1) for m in df["month"]}
+    )
+    start, end = sorted(rng.sample(quarters, 2))
+    end = date(end.year, end.month + 2, 1)
+    # filter on the flat type and town of a random row so most specs match
+    row = df.row(rng.randrange(df.height), named=True)
+    flat_type = row["flat_type"] if rng.random() < 0.5 else "ALL"
+    towns = (row["town"],) if rng.random() < 0.5 else ()
+    return FilterSpec(start, end, flat_type=flat_type, towns=towns)
+
+
+def get_exact(spec: FilterSpec, df: pl.DataFrame, by: list[str]) -> pl.DataFrame:
+    return (
+        df.filter(spec.to_expr())
+        .group_by(by)
+        .agg(
+            pl.len().alias("txn_count"),
+            *[pl.median(metric).alias(f"{metric}_exact") for metric in SKETCH_METRICS],
+        )
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rollup_medians_within_sketch_accuracy(snapshot, seed):
+    rng = random.Random(seed)
+    df = load_dataframe()
+    spec = get_random_spec(rng, df)
+    by = rng.choice(GROUPINGS)
+    assert query_rollup(spec, by) is not None
+
+    result = aggregate(spec, df, by).join(
+        get_exact(spec, df, by), on=by, how="full", coalesce=True
+    )
+    assert result["txn_count"].equals(result["txn_count_right"])
+    for metric in SKETCH_METRICS:
+        error = (result[f"{metric}_q50"] / result[f"{metric}_exact"] - 1).abs()
+        assert (error <= SKETCH_ACCURACY + 1e-9).all()
+
+
+def test_empty_selection_has_full_schema(snapshot):
+    months = get_store_months()
+    spec = FilterSpec(months[0], months[-1], towns=("PASIR RIS",), lease_years=(80, 86))
+    df = load_dataframe(spec.start_date, spec.end_date).filter(spec.to_expr())
+    assert df.is_empty()
+    assert query_rollup(spec, ["quarter_label"]) is not None
+
+    result = aggregate(spec, df, ["quarter_label"])
+    assert result.is_empty()
+    assert result.columns == aggregate(spec, df.clear(), ["quarter_label"]).columns
+
+
+def test_rebuilt_rollup_is_reread(snapshot):
+    cube, sketch = load_cube()
+    again, again_sketch = load_cube()
+    assert again is cube and again_sketch is sketch
+
+    build_rollup()
+    rebuilt, rebuilt_sketch = load_cube()
+    assert rebuilt is not cube and rebuilt_sketch is not sketch
+    assert get_build_id(get_rollup_path()) == get_build_id(get_sketch_path())
+
+
+def test_sketch_from_another_build_is_not_used(snapshot, monkeypatch, tmp_path):
+    # the rollup has been swapped in but the sketch is still the previous build's
+    sketch_path = tmp_path / "rollup_sketch.parquet"
+    pl.read_parquet(get_sketch_path()).write_parquet(
+        sketch_path, metadata={BUILD_ID: "previous"}
+    )
+    monkeypatch.setattr(rollup, "get_sketch_path", lambda subdir=None: sketch_path)
+
+    cube, sketch = load_cube()
+    assert cube.is_empty() and sketch.is_empty()
+    spec = FilterSpec(date(2020, 1, 1), date(2024, 12, 1))
+    assert query_rollup(spec, ["quarter_label"]) is None
+    df = load_dataframe(spec.start_date, spec.end_date)
+    exact = get_exact(spec, df, ["quarter_label"])
+    result = aggregate(spec, df, ["quarter_label"]).join(exact, on="quarter_label")
+    assert (result["psf_q50"] == result["psf_exact"]).all()
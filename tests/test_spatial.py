@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from webapp.update.spatial import GridIndex
+
+
+def brute_force_distances(xy: np.ndarray, points: np.ndarray) -> np.ndarray:
+    return np.sqrt(((xy[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+
+
+@pytest.fixture
+def points():
+    # clustered and spread out, on both sides of the origin
+    rng = np.random.default_rng(0)
+    spread = rng.uniform(-3000, 3000, (300, 2))
+    cluster = rng.normal(500, 80, (200, 2))
+    queries = rng.uniform(-4000, 4000, (400, 2))
+    return np.concatenate([spread, cluster]), queries
+
+
+def test_nearest_matches_brute_force(points):
+    points, queries = points
+    distances = brute_force_distances(queries, points)
+
+    best, best_index = GridIndex(points, cell=250).nearest(queries)
+
+    np.testing.assert_allclose(best, distances.min(axis=1))
+    np.testing.assert_array_equal(best_index, distances.argmin(axis=1))
+
+
+@pytest.mark.parametrize("radius", [100, 250, 400, 1000])
+def test_count_within_matches_brute_force(points, radius):
+    points, queries = points
+    distances = brute_force_distances(queries, points)
+
+    counts = GridIndex(points, cell=250).count_within(queries, radius)
+
+    np.testing.assert_array_equal(counts, (distances <= radius).sum(axis=1))
+
+
+def test_nearest_without_points():
+    best, best_index = GridIndex(np.empty((0, 2))).nearest(np.zeros((3, 2)))
+
+    assert np.isinf(best).all() and (best_index == -1).all()
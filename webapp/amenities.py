@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import polars as pl
+
+from webapp.utils import get_file_version, get_project_root, load_parquet
+
+AMENITY_FILE = "amenities.parquet"
+
+# per-address columns written by webapp.update.amenities: distances in metres
+# (ending in _m) and counts within a radius
+AMENITY_FEATURES = {
+    "mrt_m": "Nearest MRT exit (m)",
+    "bus_stops_400m": "Bus stops within 400 m",
+    "hawker_m": "Nearest hawker centre (m)",
+    "supermarket_m": "Nearest supermarket (m)",
+    "park_m": "Nearest park (m)",
+    "primary_schools_1km": "Primary schools within 1 km",
+}
+
+
+def is_distance(feature: str) -> bool:
+    return feature.endswith("_m")
+
+
+def get_amenity_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / AMENITY_FILE
+
+
+def join_amenities(df: pl.DataFrame, subdir: str = "Resale Flat Prices"):
+    """Attach the amenity columns to df by address; df is returned as is without them."""
+    path = get_amenity_path(subdir)
+    amenities = load_parquet(path, get_file_version(path))
+    if amenities.is_empty():
+        return df
+    return df.join(
+        amenities,
+        left_on=pl.col("address").cast(pl.Utf8),
+        right_on="address",
+        how="left",
+    )
@@ -0,0 +1,72 @@
+import functools
+import threading
+from collections import OrderedDict
+
+import polars as pl
+
+from webapp.read import get_snapshot_version
+
+# budget shared by every cached result in the process
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_results = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+
+def get_result_size(result) -> int:
+    if isinstance(result, pl.DataFrame):
+        return int(result.estimated_size())
+    return 0
+
+
+def spec_cache(func):
+    """
+    Cache a function of a FilterSpec in a process-wide LRU.
+
+    The key is the function, the spec and the dataset version, so no frame is
+    ever hashed; any other arguments must be derived from the spec (e.g. the
+    already filtered frame) and are not part of the key. Results are returned
+    as-is rather than copied, so callers must not modify them in place.
+    """
+    name = (func.__code__.co_filename, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(spec, *args, **kwargs):
+        key = (name, spec, get_snapshot_version())
+        with _lock:
+            if key in _results:
+                _results.move_to_end(key)
+                _stats["hits"] += 1
+                return _results[key][0]
+            _stats["misses"] += 1
+
+        result = func(spec, *args, **kwargs)
+        size = get_result_size(result)
+        with _lock:
+            if key not in _results:
+                _results[key] = (result, size)
+                _stats["bytes"] += size
+            while _results and (
+                len(_results) > RESULT_CACHE_MAX_ENTRIES
+                or _stats["bytes"] > RESULT_CACHE_MAX_BYTES
+            ):
+                _, (_, evicted_size) = _results.popitem(last=False)
+                _stats["bytes"] -= evicted_size
+                _stats["evictions"] += 1
+        return result
+
+    return wrapper
+
+
+def get_cache_stats() -> dict:
+    """Hit, miss and eviction counters plus the current entries and bytes held."""
+    with _lock:
+        return {**_stats, "entries": len(_results)}
+
+
+def clear_cache():
+    with _lock:
+        _results.clear()
+        _stats["bytes"] = 0
@@ -0,0 +1,48 @@
+import json
+import re
+
+import polars as pl
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+# 6 decimal places of a degree is about 0.1 m
+COORDINATE_DECIMALS = 6
+
+
+class CompactDeck(pdk.Deck):
+    """
+    A Deck serialised without indentation. st.pydeck_chart sends to_json()
+    as is, and pydeck indents it, which puts every number of every row on
+    its own line.
+    """
+
+    def to_json(self):
+        return json.dumps(
+            self, sort_keys=True, default=default_serialize, separators=(",", ":")
+        )
+
+
+def to_layer_data(df: pl.DataFrame, decimals: int = COORDINATE_DECIMALS) -> list:
+    """
+    The rows of df as lists for a layer's data, with floats rounded to
+    decimals. Rows without keys are a fraction of the size of dicts in
+    JSON; layers read them with get_accessor and tooltips with
+    format_tooltip. Only the columns the layer draws or shows should be
+    passed in.
+    """
+    floats = [col for col, dtype in df.schema.items() if dtype.is_float()]
+    return df.with_columns(pl.col(floats).round(decimals)).rows()
+
+
+def get_accessor(df: pl.DataFrame, *columns: str) -> str | list[str]:
+    """
+    A pydeck accessor reading columns of df from the rows of to_layer_data,
+    e.g. get_position=get_accessor(df, "longitude", "latitude").
+    """
+    fields = [f"this[{df.columns.index(col)}]" for col in columns]
+    return fields[0] if len(fields) == 1 else fields
+
+
+def format_tooltip(df: pl.DataFrame, html: str) -> str:
+    """Point the {column} placeholders of a tooltip at the rows of to_layer_data."""
+    return re.sub(r"\{(\w+)\}", lambda match: f"{{{df.columns.index(match[1])}}}", html)
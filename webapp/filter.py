@@ -1,10 +1,57 @@
-from datetime import datetime
+from dataclasses import dataclass, replace
+from datetime import date, datetime
 
 import polars as pl
 import streamlit as st
 from dateutil.relativedelta import relativedelta
 
-from webapp.read import load_dataframe
+from webapp.read import get_store_months, load_dataframe, slice_months
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """Hashable description of the sidebar selections."""
+
+    start_date: date
+    end_date: date
+    flat_type: str = "ALL"
+    towns: tuple[str, ...] = ()
+    streets: tuple[str, ...] = ()
+    storey: tuple[int, int] | None = None
+    lease_years: tuple[int, int] | None = None
+
+    def to_expr(self) -> pl.Expr:
+        """Combine all selections into a single predicate."""
+        expr = (pl.col("month") >= self.start_date) & (pl.col("month") <= self.end_date)
+        expr &= self.to_category_expr()
+        if self.lease_years:
+            expr &= self.get_predicates()["lease_years"]
+        return expr
+
+    def to_category_expr(self) -> pl.Expr:
+        """Predicate on flat type, towns, streets and storey only."""
+        expr = pl.lit(True)
+        for field, predicate in self.get_predicates().items():
+            if field != "lease_years":
+                expr &= predicate
+        return expr
+
+    def get_predicates(self) -> dict[str, pl.Expr]:
+        """The predicate of each selection other than the dates, by field."""
+        predicates = {}
+        if self.flat_type != "ALL":
+            predicates["flat_type"] = pl.col("flat_type") == self.flat_type
+        if self.towns:
+            predicates["towns"] = pl.col("town").is_in(list(self.towns))
+        if self.streets:
+            predicates["streets"] = pl.col("street_name").is_in(list(self.streets))
+        if self.storey:
+            predicates["storey"] = pl.col("storey_lower_bound").is_between(*self.storey)
+        if self.lease_years:
+            predicates["lease_years"] = pl.col("remaining_lease_years").is_between(
+                *self.lease_years
+            )
+        return predicates
 
 
 class SidebarFilter:
@@ -20,9 +67,8 @@ class SidebarFilter:
         select_storey=False,
         default_flat_type="ALL",
         default_town=None,
+        columns=None,
     ):
-        if not df:
-            df = load_dataframe()
         self.df = df
         now = datetime.now()
         self.min_date = min_date or (now - relativedelta(months=12)).date()
@@ -36,13 +82,19 @@ class SidebarFilter:
         self.hide_elements()
 
         self.start_date, self.end_date = self.create_slider()
-        self.df = self.df.filter(
-            (pl.col("month") >= self.start_date) & (pl.col("month") <= self.end_date)
-        )
+        self.spec = FilterSpec(self.start_date, self.end_date)
+        if self.df is None:
+            # only the month partitions inside the selected range are read
+            self.df = load_dataframe(self.start_date, self.end_date)
+        else:
+            self.df = slice_months(self.df, self.start_date, self.end_date)
+        self.lf = self.df.lazy()
 
+        # each widget adds its selection to one lazy plan; options are small
+        # queries over the plan so far and the rows are only collected at the end
         if select_flat_type:
             self.option_flat = self.create_flat_select()
-            self.df = self.filter_by_flat_type()
+            self.narrow(flat_type=self.option_flat)
 
         show_town_filter, town_filter_type = select_towns
         if show_town_filter:
@@ -53,28 +105,38 @@ class SidebarFilter:
                 self.selected_towns = self.create_town_multiselect()
 
         if self.selected_towns:
-            self.df = self.df.filter(pl.col("town").is_in(self.selected_towns))
+            self.narrow(towns=tuple(self.selected_towns))
 
         if select_street:
             self.selected_street = self.create_streets_multiselect()
             if self.selected_street:
-                self.df = self.df.filter(
-                    pl.col("street_name").is_in(self.selected_street)
-                )
+                self.narrow(streets=tuple(self.selected_street))
 
         if select_storey:
-            start_storey, end_storey = self.create_storey_slider()
-            self.df = self.df.filter(
-                (pl.col("storey_lower_bound") >= start_storey)
-                & (pl.col("storey_lower_bound") <= end_storey)
-            )
+            self.narrow(storey=self.create_storey_slider())
 
         if select_lease_years:
-            start_year, end_year = self.create_lease_select()
-            self.df = self.df.filter(
-                (pl.col("remaining_lease_years") >= start_year)
-                & (pl.col("remaining_lease_years") <= end_year)
-            )
+            self.narrow(lease_years=self.create_lease_select())
+
+        self.df = (self.lf.select(columns) if columns else self.lf).collect()
+
+    def narrow(self, **selections):
+        """Add selections to the spec and filter the plan by the new ones."""
+        spec = replace(self.spec, **selections)
+        predicates = spec.get_predicates()
+        for field in selections:
+            if field in predicates and getattr(spec, field) != getattr(
+                self.spec, field
+            ):
+                self.lf = self.lf.filter(predicates[field])
+        self.spec = spec
+
+    def get_options(self, column: str) -> list:
+        return sorted(self.lf.select(pl.col(column).unique()).collect().to_series())
+
+    def get_bounds(self, column: str) -> tuple[int, int]:
+        bounds = self.lf.select(pl.col(column).min(), pl.col(column).max().alias("max"))
+        return tuple(int(bound) for bound in bounds.collect().row(0))
 
     def hide_elements(self):
         hide_css = """
@@ -89,16 +151,21 @@ class SidebarFilter:
             st.markdown(hide_css, unsafe_allow_html=True)
 
     def create_slider(self):
+        if self.df is None:
+            months = get_store_months()
+            min_month, max_month = months[0], months[-1]
+        else:
+            min_month, max_month = self.df["month"].min(), self.df["month"].max()
         return st.sidebar.slider(
             "Select date range",
-            min_value=self.df["month"].min(),
-            max_value=self.df["month"].max(),
+            min_value=min_month,
+            max_value=max_month,
             value=(self.min_date, self.max_date),
             format="YYYY-MM",
         )
 
     def create_flat_select(self):
-        flat_types = sorted(self.df["flat_type"].unique())
+        flat_types = self.get_options("flat_type")
         flat_types.insert(0, "ALL")
         return st.sidebar.selectbox(
             "Select flat type",
@@ -106,14 +173,8 @@ class SidebarFilter:
             index=flat_types.index(self.default_flat_type),
         )
 
-    def filter_by_flat_type(self):
-        if self.option_flat != "ALL":
-            return self.df.filter(pl.col("flat_type") == self.option_flat)
-        else:
-            return self.df
-
     def create_town_select(self):
-        town_filter = sorted(self.df["town"].unique())
+        town_filter = self.get_options("town")
         if self.default_town in town_filter:
             default_index = town_filter.index(self.default_town)
         else:
@@ -127,7 +188,7 @@ class SidebarFilter:
         return [town]
 
     def create_streets_multiselect(self):
-        street_filter = sorted(self.df["street_name"].unique())
+        street_filter = self.get_options("street_name")
         return st.sidebar.multiselect(
             "Select street(s)",
             options=street_filter,
@@ -136,8 +197,7 @@ class SidebarFilter:
         )
 
     def create_storey_slider(self):
-        min_storey = int(self.df["storey_lower_bound"].min())
-        max_storey = int(self.df["storey_lower_bound"].max())
+        min_storey, max_storey = self.get_bounds("storey_lower_bound")
         return st.sidebar.slider(
             "Select storey range (inclusive)",
             min_value=min_storey,
@@ -146,7 +206,7 @@ class SidebarFilter:
         )
 
     def create_town_multiselect(self):
-        town_filter = sorted(self.df["town"].unique())
+        town_filter = self.get_options("town")
         return st.sidebar.multiselect(
             "Select town(s)",
             options=town_filter,
@@ -157,8 +217,7 @@ class SidebarFilter:
         )
 
     def create_lease_select(self):
-        min_lease = int(self.df["remaining_lease_years"].min())
-        max_lease = int(self.df["remaining_lease_years"].max())
+        min_lease, max_lease = self.get_bounds("remaining_lease_years")
         return st.sidebar.slider(
             "Select remaining lease years",
             min_value=min_lease,
@@ -0,0 +1,212 @@
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+
+from webapp.filter import FilterSpec
+from webapp.utils import get_file_version, get_project_root, load_parquet
+
+GRID_FILE = "heatmap_grid.parquet"
+STREETS_FILE = "heatmap_streets.parquet"
+
+# cell sizes in metres materialised by the ETL, finest first
+GRID_SIZES = [50, 100, 250, 500]
+DEGREE_PER_METRE = 1 / 111000
+
+# one pyramid row per grid size, period, flat type and cell; a period is a
+# month, or a calendar year so long ranges merge fewer rows
+GRID_KEYS = ["month", "flat_type", "lat_bin", "lon_bin"]
+GRID_SPANS = [1, 12]
+
+
+def get_grid_degrees(grid_size: int) -> float:
+    return grid_size * DEGREE_PER_METRE
+
+
+def to_grid_bin(column: str, grid_size: int) -> pl.Expr:
+    """Index of the cell whose centre is nearest, in steps of grid_size metres."""
+    return (pl.col(column) / get_grid_degrees(grid_size)).round().cast(pl.Int32)
+
+
+def get_merge_exprs() -> list[pl.Expr]:
+    """Combine partial aggregates of the same cell."""
+    return [
+        pl.sum("count"),
+        pl.sum("psf_sum"),
+        pl.sum("resale_price_sum"),
+        pl.min("resale_price_min"),
+        pl.max("resale_price_max"),
+        pl.sum("remaining_lease_years_sum"),
+        pl.min("lease_years_min"),
+        pl.max("lease_years_max"),
+    ]
+
+
+def to_grid_cells(lf: pl.LazyFrame, grid_size: int) -> pl.LazyFrame:
+    """The rows that can be placed on the grid, with their cell at grid_size."""
+    return lf.drop_nulls(["latitude", "longitude", "psf"]).with_columns(
+        to_grid_bin("latitude", grid_size).alias("lat_bin"),
+        to_grid_bin("longitude", grid_size).alias("lon_bin"),
+    )
+
+
+def summarize_grid(lf: pl.LazyFrame, grid_size: int) -> pl.LazyFrame:
+    """
+    Partial aggregates of every cell at grid_size, per month and flat type.
+    Rows for the same cell merge with get_merge_exprs.
+    """
+    return (
+        to_grid_cells(lf, grid_size)
+        .group_by(GRID_KEYS)
+        .agg(
+            pl.len().alias("count"),
+            pl.col("psf").cast(pl.Float64).sum().alias("psf_sum"),
+            pl.col("resale_price").cast(pl.Float64).sum().alias("resale_price_sum"),
+            pl.min("resale_price").alias("resale_price_min"),
+            pl.max("resale_price").alias("resale_price_max"),
+            pl.col("remaining_lease_years")
+            .cast(pl.Float64)
+            .sum()
+            .alias("remaining_lease_years_sum"),
+            pl.min("remaining_lease_years").alias("lease_years_min"),
+            pl.max("remaining_lease_years").alias("lease_years_max"),
+        )
+    )
+
+
+def summarize_streets(lf: pl.LazyFrame, grid_size: int) -> pl.LazyFrame:
+    """
+    The street with the most transactions in every cell at grid_size, ties
+    going to the first alphabetically.
+    """
+    return (
+        to_grid_cells(lf, grid_size)
+        .group_by("lat_bin", "lon_bin", "street_name")
+        .agg(pl.len().alias("count"))
+        .sort(["count", pl.col("street_name").cast(pl.Utf8)], descending=[True, False])
+        .unique(["lat_bin", "lon_bin"], keep="first")
+        .select("lat_bin", "lon_bin", pl.col("street_name").alias("mode_street"))
+    )
+
+
+def merge_grid(
+    cells: pl.DataFrame, streets: pl.DataFrame, grid_size: int
+) -> pl.DataFrame:
+    """
+    Combine partial aggregates into one row per cell, centred on the cell,
+    labelled with the cell's street from streets.
+    """
+    grid_degrees = get_grid_degrees(grid_size)
+    return (
+        cells.group_by("lat_bin", "lon_bin")
+        .agg(get_merge_exprs())
+        .join(streets, on=["lat_bin", "lon_bin"], how="left")
+        .select(
+            (pl.col("lat_bin") * grid_degrees).alias("lat_bin"),
+            (pl.col("lon_bin") * grid_degrees).alias("lon_bin"),
+            (pl.col("psf_sum") / pl.col("count")).alias("avg_psf"),
+            (pl.col("resale_price_sum") / pl.col("count")).alias("avg_price"),
+            pl.col("resale_price_max").alias("max_price"),
+            pl.col("resale_price_min").alias("min_price"),
+            (pl.col("remaining_lease_years_sum") / pl.col("count")).alias(
+                "avg_remaining_lease"
+            ),
+            pl.col("mode_street").cast(pl.Utf8),
+            pl.col("count").cast(pl.UInt32),
+        )
+    )
+
+
+def get_grid_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / GRID_FILE
+
+
+def get_streets_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / STREETS_FILE
+
+
+def load_level(path: Path, grid_size: int) -> pl.DataFrame | None:
+    """
+    The rows of grid_size in a file written one grid size after another,
+    smallest first, or None when the file has none.
+    """
+    frame = load_parquet(path, get_file_version(path))
+    if frame.is_empty():
+        return None
+    start = frame["grid_size"].search_sorted(grid_size, side="left")
+    end = frame["grid_size"].search_sorted(grid_size, side="right")
+    if start == end:
+        return None
+    return frame.slice(start, end - start)
+
+
+def get_period_expr(spec: FilterSpec) -> pl.Expr:
+    """
+    Select the year rows of the calendar years inside the date range and the
+    month rows of the other months in it, so every month is counted once.
+    """
+    in_range = (pl.col("month") >= spec.start_date) & (pl.col("month") <= spec.end_date)
+    first_year = spec.start_date.year + (
+        spec.start_date > date(spec.start_date.year, 1, 1)
+    )
+    last_year = spec.end_date.year - (spec.end_date < date(spec.end_date.year, 12, 1))
+    if first_year > last_year:
+        return in_range & (pl.col("span_months") == 1)
+    full_years = (pl.col("month") >= date(first_year, 1, 1)) & (
+        pl.col("month") <= date(last_year, 12, 1)
+    )
+    return (
+        pl.when(pl.col("span_months") == 12)
+        .then(full_years)
+        .otherwise(in_range & ~full_years)
+    )
+
+
+def query_grid(spec: FilterSpec, grid_size: int) -> pl.DataFrame | None:
+    """
+    Return the pyramid rows at grid_size selected by spec.
+
+    Rows are per month or year, so the date range always lines up with them,
+    but a row spans a range of remaining lease years. As with the rollup, None
+    is returned when a row is only partly inside the lease selection, or spec
+    filters on columns the pyramid does not keep.
+    """
+    if spec.towns or spec.storey:
+        return None
+    level = load_level(get_grid_path(), grid_size)
+    if level is None:
+        return None
+
+    cells = level.filter(get_period_expr(spec) & spec.to_category_expr())
+    if spec.lease_years:
+        start, end = spec.lease_years
+        inside = (pl.col("lease_years_min") >= start) & (
+            pl.col("lease_years_max") <= end
+        )
+        outside = (pl.col("lease_years_max") < start) | (
+            pl.col("lease_years_min") > end
+        )
+        if not cells.filter(~inside & ~outside).is_empty():
+            return None
+        cells = cells.filter(inside)
+    return cells
+
+
+def aggregate_grid(spec: FilterSpec, df: pl.DataFrame, grid_size: int) -> pl.DataFrame:
+    """
+    Average psf, price and remaining lease, price range, most frequent street
+    and transaction count per grid cell.
+
+    Served from the pyramid when it answers spec, otherwise by binning the
+    rows in df, which must then have the columns summarize_grid reads. Both
+    paths merge the same partial aggregates and return the same columns. The
+    street is the cell's most frequent over the whole history, or over df
+    before the street table has been built.
+    """
+    cells = query_grid(spec, grid_size)
+    if cells is None:
+        cells = summarize_grid(df.lazy(), grid_size).collect()
+    streets = load_level(get_streets_path(), grid_size)
+    if streets is None:
+        streets = summarize_streets(df.lazy(), grid_size).collect()
+    return merge_grid(cells, streets.drop("grid_size", strict=False), grid_size)
@@ -2,6 +2,9 @@ import streamlit as st
 
 from webapp.logo import icon, logo
 from webapp.read import get_last_updated_badge
+from webapp.update.build import ensure_dataset
+from webapp.update.manifest import get_manifest_path
+from webapp.utils import get_file_version
 
 
 def main():
@@ -46,6 +49,10 @@ if __name__ == "__main__":
         ],
     }
 
+    # the store and the files derived from it are built from the committed CSVs
+    subdir = "Resale Flat Prices"
+    ensure_dataset(subdir, get_file_version(get_manifest_path(subdir)))
+
     pg = st.navigation(pages)
 
     pg.run()
@@ -0,0 +1,120 @@
+import json
+import re
+from pathlib import Path
+
+import polars as pl
+
+from webapp.utils import get_dataset_filename, get_project_root
+
+LAYER_DIR = get_project_root() / "data" / "Standalone Datasets"
+CACHE_DIR = "cache"
+CACHE_INDEX = "index.json"
+
+# KML exports, e.g. the supermarkets, keep their attributes in an HTML table
+KML_TABLE = "<center><table>"
+KML_ATTRIBUTE = re.compile(r"<th>(\w+)</th>\s*<td>(.*?)</td>")
+
+
+def get_layer_version(file_name: str, layer_dir: Path = LAYER_DIR) -> str:
+    """
+    The dataset's lastUpdatedAt from metadata.json, which download_dataset
+    refreshes with each download; the file's mtime for files not listed there.
+    """
+    metadata_file = layer_dir / "metadata.json"
+    if metadata_file.exists():
+        with open(metadata_file) as file:
+            metadata = json.load(file)
+        for dataset_id, meta in metadata.items():
+            name = get_dataset_filename(
+                meta.get("name", dataset_id), meta.get("format", "csv")
+            )
+            if name == file_name and meta.get("lastUpdatedAt"):
+                return meta["lastUpdatedAt"]
+    return f"mtime:{(layer_dir / file_name).stat().st_mtime_ns}"
+
+
+def get_properties(properties: dict) -> dict:
+    description = properties.get("Description")
+    if isinstance(description, str) and description.startswith(KML_TABLE):
+        properties = {k: v for k, v in properties.items() if k != "Description"}
+        properties.update(KML_ATTRIBUTE.findall(description))
+    return properties
+
+
+def get_position(geometry: dict) -> tuple[float, float, list | None]:
+    """
+    (latitude, longitude, outline) of a feature. Polygons are placed at the
+    mean of their outline, the exterior ring of their largest part.
+    """
+    if geometry["type"] == "Point":
+        longitude, latitude = geometry["coordinates"][:2]
+        return latitude, longitude, None
+
+    polygons = geometry["coordinates"]
+    if geometry["type"] == "Polygon":
+        polygons = [polygons]
+    outline = max((polygon[0] for polygon in polygons), key=len)
+    # the last vertex of a ring repeats the first
+    vertices = outline[:-1] or outline
+    longitude = sum(v[0] for v in vertices) / len(vertices)
+    latitude = sum(v[1] for v in vertices) / len(vertices)
+    return latitude, longitude, [v[:2] for v in outline]
+
+
+def parse_layer(path: Path) -> pl.DataFrame:
+    """
+    Flatten a GeoJSON file into one row per feature: geometry_type, latitude,
+    longitude, outline (polygons only, as [lon, lat] pairs) and the
+    feature's properties as columns.
+    """
+    with open(path) as file:
+        features = json.load(file)["features"]
+
+    rows = []
+    for feature in features:
+        latitude, longitude, outline = get_position(feature["geometry"])
+        rows.append(
+            {
+                "geometry_type": feature["geometry"]["type"],
+                "latitude": latitude,
+                "longitude": longitude,
+                "outline": outline,
+                **get_properties(feature["properties"]),
+            }
+        )
+    return pl.DataFrame(rows, infer_schema_length=None, strict=False).with_columns(
+        pl.col("latitude", "longitude").cast(pl.Float64),
+        pl.col("outline").cast(pl.List(pl.Array(pl.Float64, 2))),
+    )
+
+
+def load_layer(file_name: str, layer_dir: Path = LAYER_DIR) -> pl.DataFrame:
+    """
+    Load a GeoJSON layer from its Parquet cache, converting it first if the
+    cache is missing or was built from an older version of the dataset.
+    """
+    cache_dir = layer_dir / CACHE_DIR
+    cache_file = cache_dir / f"{Path(file_name).stem}.parquet"
+    index_file = cache_dir / CACHE_INDEX
+    version = get_layer_version(file_name, layer_dir)
+
+    index = {}
+    if index_file.exists():
+        with open(index_file) as file:
+            index = json.load(file)
+    if index.get(file_name) == version and cache_file.exists():
+        return pl.read_parquet(cache_file)
+
+    df = parse_layer(layer_dir / file_name)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    df.write_parquet(tmp_file)
+    tmp_file.replace(cache_file)
+
+    index[file_name] = version
+    tmp_file = index_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as file:
+        json.dump(dict(sorted(index.items())), file, indent=2)
+    tmp_file.replace(index_file)
+    print(f"Cached {file_name} ({df.height} features) at version {version}")
+    return df
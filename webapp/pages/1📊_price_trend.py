@@ -6,71 +6,76 @@ import polars as pl
 import streamlit as st
 from plotly.subplots import make_subplots
 
-from webapp.filter import SidebarFilter
+from webapp.cache import spec_cache
+from webapp.filter import FilterSpec, SidebarFilter
 from webapp.read import get_annual_new_units
-from webapp.utils import pastel_colors, add_pie_slices, apply_default_theme
-
+from webapp.rollup import aggregate
+from webapp.utils import add_pie_slices, apply_default_theme, pastel_colors
 
 st.set_page_config(page_title="Resale Trends", layout="wide")
 
 
-@st.cache_data
-def get_median_resale_data(df: pl.DataFrame):
+@spec_cache
+def get_median_resale_data(spec: FilterSpec, _df: pl.DataFrame):
     return (
-        df.group_by("quarter_label")
-        .agg(
-            pl.median("psf").alias("median_psf"),
-            pl.max("resale_price").alias("max_price"),
-            pl.median("resale_price").alias("median_price"),
-            pl.len().alias("txn_count"),
+        aggregate(spec, _df, ["quarter_label"])
+        .select(
+            "quarter_label",
+            pl.col("psf_q50").alias("median_psf"),
+            pl.col("resale_price_max").alias("max_price"),
+            pl.col("resale_price_q50").alias("median_price"),
+            "txn_count",
         )
         .sort("quarter_label")
     )
 
 
-@st.cache_data
-def get_lease_years_data(df: pl.DataFrame):
+@spec_cache
+def get_lease_years_data(spec: FilterSpec, _df: pl.DataFrame):
     return (
-        df.group_by(["quarter_label", "cat_remaining_lease_years"])
-        .agg(
-            pl.median("resale_price").alias("median_resale_price"),
-            pl.median("psf").alias("median_psf"),
-            pl.len().alias("transaction_volume"),
+        aggregate(spec, _df, ["quarter_label", "cat_remaining_lease_years"])
+        .select(
+            "quarter_label",
+            "cat_remaining_lease_years",
+            pl.col("resale_price_q50").alias("median_resale_price"),
+            pl.col("psf_q50").alias("median_psf"),
+            pl.col("txn_count").alias("transaction_volume"),
         )
         .sort(["cat_remaining_lease_years", "quarter_label"])
         .sort(by="quarter_label")
     )
 
 
-@st.cache_data
-def get_town_data(df: pl.DataFrame):
+@spec_cache
+def get_town_data(spec: FilterSpec, _df: pl.DataFrame):
     return (
-        df.group_by(["quarter_label", "town"])
-        .agg(
-            pl.median("resale_price").alias("resale_price"),
-            pl.median("psf").alias("psf"),
-            pl.count("resale_price").alias("transaction_volume"),
+        aggregate(spec, _df, ["quarter_label", "town"])
+        .select(
+            "quarter_label",
+            "town",
+            pl.col("resale_price_q50").alias("resale_price"),
+            pl.col("psf_q50").alias("psf"),
+            pl.col("txn_count").alias("transaction_volume"),
         )
         .sort(["town", "quarter_label"])
     )
 
 
-@st.cache_data
-def get_flat_type_data(df: pl.DataFrame):
-    all_flat_types = df["flat_type"].unique().sort()
+@spec_cache
+def get_flat_type_data(spec: FilterSpec, _df: pl.DataFrame):
+    chart_df = aggregate(spec, _df, ["quarter_label", "flat_type"]).select(
+        "quarter_label",
+        "flat_type",
+        pl.col("resale_price_q50").alias("resale_price"),
+        pl.col("psf_q50").alias("psf"),
+        pl.col("txn_count").alias("transaction_volume"),
+    )
+    all_flat_types = chart_df["flat_type"].unique().sort()
     return (
-        df.select("quarter_label")
+        chart_df.select("quarter_label")
         .unique()
         .join(pl.DataFrame({"flat_type": all_flat_types}), how="cross")
-        .join(
-            df.group_by(["quarter_label", "flat_type"]).agg(
-                pl.median("resale_price").alias("resale_price"),
-                pl.median("psf").alias("psf"),
-                pl.len().alias("transaction_volume"),
-            ),
-            on=["quarter_label", "flat_type"],
-            how="left",
-        )
+        .join(chart_df, on=["quarter_label", "flat_type"], how="left")
         .sort(["flat_type", "quarter_label"])
         .with_columns(
             is_interpolated=pl.col("resale_price").is_null(),
@@ -82,7 +87,7 @@ def get_flat_type_data(df: pl.DataFrame):
 
 
 def plot_median_resale(sf: SidebarFilter, metric, annotations):
-    chart_df = get_median_resale_data(sf.df)
+    chart_df = get_median_resale_data(sf.spec, sf.df)
 
     is_psf = metric == "Price per Sqft (PSF)"
     y_col = "median_psf" if is_psf else "median_price"
@@ -215,7 +220,7 @@ def plot_median_resale(sf: SidebarFilter, metric, annotations):
 
 
 def plot_lease_years(sf: SidebarFilter, metric, annotations: dict):
-    chart_df = get_lease_years_data(sf.df)
+    chart_df = get_lease_years_data(sf.spec, sf.df)
 
     is_psf = metric == "Price per Sqft (PSF)"
     y_col = "median_psf" if is_psf else "median_resale_price"
@@ -396,7 +401,7 @@ def plot_town(sf: SidebarFilter, metric, annotations: dict):
     col1, col2 = st.columns(spec=[0.5, 0.5])
     show_transaction_volumes = col1.checkbox("Show transaction volumes", value=False)
 
-    chart_df = get_town_data(sf.df)
+    chart_df = get_town_data(sf.spec, sf.df)
     unique_towns = chart_df["town"].unique().sort()
     n_towns = len(unique_towns)
 
@@ -562,7 +567,7 @@ def plot_flat_type(sf: SidebarFilter, metric):
         horizontal_spacing=0.1,
     )
     colors = px.colors.qualitative.Plotly
-    chart_df = get_flat_type_data(sf.df)
+    chart_df = get_flat_type_data(sf.spec, sf.df)
     all_flat_types = chart_df["flat_type"].unique().sort()
 
     is_psf = metric == "Price per Sqft (PSF)"
@@ -577,7 +582,9 @@ def plot_flat_type(sf: SidebarFilter, metric):
         flat_type_df = chart_df.filter(pl.col("flat_type") == flat_type)
 
         actual_prices = flat_type_df.with_columns(
-            actual=pl.when(pl.col("is_interpolated")).then(None).otherwise(pl.col(y_col))
+            actual=pl.when(pl.col("is_interpolated"))
+            .then(None)
+            .otherwise(pl.col(y_col))
         )["actual"]
 
         fig.add_trace(
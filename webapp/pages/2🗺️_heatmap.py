@@ -1,64 +1,40 @@
 import streamlit as st
 import polars as pl
 import pydeck as pdk
-import plotly.colors as pc
 
+from webapp.deck import CompactDeck, format_tooltip, get_accessor, to_layer_data
 from webapp.filter import SidebarFilter
-
-
-def create_heatmap_layer(df, grid_size_meters=70):
-    degree_per_meter = 1 / 111000
-    grid_size_deg = grid_size_meters * degree_per_meter
-
-    # use simple rounding to create grid centroids
-    df_grid = df.with_columns(
-        [
-            ((pl.col("latitude") / grid_size_deg).round() * grid_size_deg).alias(
-                "lat_bin"
-            ),
-            ((pl.col("longitude") / grid_size_deg).round() * grid_size_deg).alias(
-                "lon_bin"
-            ),
-        ]
-    )
-
-    # Calculate average PSF, price stats, and most frequent street
-    agg_exprs = [
-        pl.col("psf").mean().alias("avg_psf"),
-        pl.col("resale_price").mean().alias("avg_price"),
-        pl.col("resale_price").max().alias("max_price"),
-        pl.col("resale_price").min().alias("min_price"),
-        pl.col("remaining_lease_years").mean().alias("avg_remaining_lease"),
-        pl.col("street_name").mode().first().alias("mode_street"),
-        pl.len().alias("count"),
-    ]
-
-    agg_df = df_grid.group_by(["lat_bin", "lon_bin"]).agg(agg_exprs)
-
-    if isinstance(agg_df, pl.LazyFrame):
-        agg_df = agg_df.collect()
-
-    return agg_df, grid_size_meters
-
+from webapp.heatmap import GRID_SIZES, aggregate_grid, get_grid_degrees
+from webapp.utils import format_number, map_colors
 
 # Sidebar Filters
 sb = SidebarFilter(
     select_towns=(False, "single"),  # Heatmap covers all towns
     select_lease_years=True,
     select_flat_type=True,
+    columns=[
+        "month",
+        "flat_type",
+        "latitude",
+        "longitude",
+        "psf",
+        "resale_price",
+        "remaining_lease_years",
+        "street_name",
+    ],
+)
+grid_size_meters = st.sidebar.select_slider(
+    "Grid size (m)", options=GRID_SIZES, value=100
 )
-filtered_df = sb.df
 
-# Ensure valid coordinates
-filtered_df = filtered_df.drop_nulls(subset=["latitude", "longitude", "psf"])
+# merged from the ETL's pyramid for the months in range when it covers the
+# selection, otherwise binned from the filtered rows
+agg_df = aggregate_grid(sb.spec, sb.df, grid_size_meters)
 
-if filtered_df.is_empty():
+if agg_df.is_empty():
     st.warning("No data found for the selected filters.")
     st.stop()
 
-grid_size_meters = 70
-agg_df, grid_meters = create_heatmap_layer(filtered_df, grid_size_meters=grid_size_meters)
-
 st.title("🗺️ HDB Resale Price Heatmap")
 st.markdown(
     f"Visualize average resale prices (PSF) in {grid_size_meters}x{grid_size_meters}m grids."
@@ -79,91 +55,57 @@ st.caption(
 st.caption(rf"Price Range (PSF): \${min_psf:,.0f} - \${max_psf:,.0f}")
 
 # Pydeck Layer
-# Use PolygonLayer for exact square boxes
-degree_per_meter = 1 / 111000
-grid_size_deg = grid_size_meters * degree_per_meter
-half_size = grid_size_deg / 2
-
-
-def get_polygon(row):
-    lat = row["lat_bin"]
-    lon = row["lon_bin"]
-    return [
-        [lon - half_size, lat - half_size],
-        [lon + half_size, lat - half_size],
-        [lon + half_size, lat + half_size],
-        [lon - half_size, lat + half_size],
-    ]
-
-
-# Color Mapping Logic
-def get_color_mapped(val, vmin, vmax, colorscale_name="Portland"):
-    # Normalize
-    if vmax == vmin:
-        norm_val = 0.5
-    else:
-        norm_val = (val - vmin) / (vmax - vmin)
-
-    target_val = norm_val
-
-    # Get color from Plotly
-    # sample_colorscale returns a list of colors, we take the first one
-    color_str = pc.sample_colorscale(colorscale_name, [target_val])[0]
-
-    # Parse color string
-    try:
-        if color_str.startswith("rgb"):
-            # format: rgb(r, g, b) or rgba(r, g, b, a)
-            content = color_str.split("(")[1].split(")")[0]
-            parts = [float(x.strip()) for x in content.split(",")]
-            r, g, b = int(parts[0]), int(parts[1]), int(parts[2])
-            return [r, g, b, 180]  # Add alpha 180
-        elif color_str.startswith("#"):
-            # format: #RRGGBB
-            return list(pc.hex_to_rgb(color_str)) + [180]
-    except Exception:
-        pass
-
-    return [128, 128, 128, 180]  # Fallback
-
-
-# Apply color mapping and polygon creation
-pdf = agg_df.to_pandas()
-pdf["color"] = pdf["avg_psf"].apply(lambda x: get_color_mapped(x, min_psf, max_psf))
-pdf["polygon"] = pdf.apply(get_polygon, axis=1)
+# GridCellLayer draws each cell as a square from its bottom-left corner.
+# deck.gl measures metres at 111,320 per degree, so the size is taken from
+# the grid's degrees for the cells to tile exactly
+grid_size_deg = get_grid_degrees(grid_size_meters)
+corners = agg_df.select(
+    pl.col("lon_bin") - grid_size_deg / 2, pl.col("lat_bin") - grid_size_deg / 2
+).to_numpy()
+colors = map_colors(agg_df["avg_psf"].to_numpy(), min_psf, max_psf)
 
 # Format for tooltip
-pdf["fmt_psf"] = pdf["avg_psf"].apply(lambda x: f"${x:,.2f}")
-pdf["fmt_price"] = pdf["avg_price"].apply(lambda x: f"${x:,.0f}")
-pdf["fmt_max_price"] = pdf["max_price"].apply(lambda x: f"${x:,.0f}")
-pdf["fmt_min_price"] = pdf["min_price"].apply(lambda x: f"${x:,.0f}")
-pdf["fmt_lease"] = pdf["avg_remaining_lease"].apply(lambda x: f"{x:.1f} yrs")
+cells = agg_df.select(
+    pl.Series("lon", corners[:, 0]),
+    pl.Series("lat", corners[:, 1]),
+    pl.Series("r", colors[:, 0]),
+    pl.Series("g", colors[:, 1]),
+    pl.Series("b", colors[:, 2]),
+    "mode_street",
+    "count",
+    format_number(pl.col("avg_psf"), 2).alias("fmt_psf"),
+    format_number(pl.col("avg_price")).alias("fmt_price"),
+    format_number(pl.col("max_price")).alias("fmt_max_price"),
+    format_number(pl.col("min_price")).alias("fmt_min_price"),
+    format_number(pl.col("avg_remaining_lease"), 1).alias("fmt_lease"),
+)
 
+# cells are sent as rows of values rather than dicts, see webapp.deck
 layer = pdk.Layer(
-    "PolygonLayer",
+    "GridCellLayer",
     id="heatmap_layer",
-    data=pdf,
-    get_polygon="polygon",
-    get_fill_color="color",
-    get_line_color=[0, 0, 0, 0],  # No outline
+    data=to_layer_data(cells),
+    get_position=get_accessor(cells, "lon", "lat"),
+    get_fill_color=get_accessor(cells, "r", "g", "b"),
+    cell_size=grid_size_deg * 111_320,
     pickable=True,
     auto_highlight=True,
-    opacity=0.8,
-    stroked=False,
-    filled=True,
+    # every cell has the LUT's alpha, so it is applied once here
+    opacity=0.8 * colors[0, 3] / 255,
     extruded=False,
 )
 
 # Tooltip
 tooltip = {
-    "html": (
+    "html": format_tooltip(
+        cells,
         "<b>Street:</b> {mode_street}<br/>"
-        "<b>Average PSF:</b> {fmt_psf}<br/>"
-        "<b>Avg Price:</b> {fmt_price}<br/>"
-        "<b>Min Price:</b> {fmt_min_price}<br/>"
-        "<b>Max Price:</b> {fmt_max_price}<br/>"
-        "<b>Avg Lease:</b> {fmt_lease}<br/>"
-        "<b>Transactions:</b> {count}"
+        "<b>Average PSF:</b> ${fmt_psf}<br/>"
+        "<b>Avg Price:</b> ${fmt_price}<br/>"
+        "<b>Min Price:</b> ${fmt_min_price}<br/>"
+        "<b>Max Price:</b> ${fmt_max_price}<br/>"
+        "<b>Avg Lease:</b> {fmt_lease} yrs<br/>"
+        "<b>Transactions:</b> {count}",
     ),
     "style": {"backgroundColor": "steelblue", "color": "white"},
 }
@@ -176,7 +118,7 @@ view_state = pdk.ViewState(
     pitch=0,
 )
 
-deck = pdk.Deck(
+deck = CompactDeck(
     map_style="https://basemaps.cartocdn.com/gl/positron-gl-style/style.json",
     initial_view_state=view_state,
     layers=[layer],
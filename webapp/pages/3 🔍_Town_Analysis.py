@@ -1,3 +1,5 @@
+import json
+
 import folium
 import polars as pl
 import streamlit as st
@@ -6,6 +8,7 @@ from PIL import Image
 from streamlit_folium import st_folium
 from branca.element import Template, MacroElement
 
+from webapp.amenities import AMENITY_FEATURES, is_distance, join_amenities
 from webapp.filter import SidebarFilter
 
 st.set_page_config(layout="wide")
@@ -33,13 +36,36 @@ percentage_threshold = col2.number_input("Threshold", 0.0, 1.0, 0.1, step=0.1)
 
 show_all = st.sidebar.toggle("Show all transactions", value=True)
 
+# precomputed per address by the ETL; missing until the first amenities build
+df = join_amenities(sf.df)
+features = {col: label for col, label in AMENITY_FEATURES.items() if col in df.columns}
+if features:
+    feature = st.sidebar.selectbox(
+        "Filter by amenity", list(features), format_func=features.get
+    )
+    if is_distance(feature):
+        max_m = st.sidebar.slider(features[feature], 100, 2000, 2000, step=100)
+        if max_m < 2000:
+            df = df.filter(pl.col(feature) <= max_m)
+    else:
+        most = max(int(df[feature].max() or 0), 1)
+        min_count = st.sidebar.slider(f"{features[feature]}, at least", 0, most, 0)
+        if min_count:
+            df = df.filter(pl.col(feature) >= min_count)
+else:
+    df = df.with_columns(
+        mrt_station=pl.lit(None, pl.Utf8), mrt_m=pl.lit(None, pl.Int32)
+    )
+# the MRT exit is shown with its station; the other features follow it
+tooltip_features = [col for col in features if col != "mrt_m"]
+
 try:
-    median_resale_price = sf.df["resale_price"].median()
+    median_resale_price = df["resale_price"].median()
     # Calculate the absolute threshold value based on the percentage
     threshold = median_resale_price * percentage_threshold
 
     # Bin the resale prices based on the median and percentage threshold
-    filtered = sf.df.with_columns(
+    filtered = df.with_columns(
         pl.when(pl.col("resale_price") < (median_resale_price - threshold))
         .then(pl.lit("Low"))
         .when(pl.col("resale_price") > (median_resale_price + threshold))
@@ -52,7 +78,7 @@ try:
         f"Median price: `${median_resale_price:,.0f}`",
     )
     # Count the occurrences of each bin
-    cat_resale_price = sf.df.group_by("resale_price").agg(pl.len().alias("count"))
+    cat_resale_price = df.group_by("resale_price").agg(pl.len().alias("count"))
     cat_resale_price = cat_resale_price.rename({"resale_price": "Resale Price"})
 
     cat_resale_price = cat_resale_price.with_columns(
@@ -154,6 +180,12 @@ try:
             var sqft = row[7];
             var lease = row[8];
             var cat_resale_price = row[9];
+            var mrt_station = row[10];
+            var mrt_m = row[11];
+            var amenities = AMENITY_LABELS.map((label, i) =>
+                row[12 + i] === null ? "" :
+                `<br><span style="font-weight: bold;">${label}:</span> ${row[12 + i]}`
+            ).join("");
 
             var color = cat_resale_price === "Low" ? "green" :
                         cat_resale_price === "Medium" ? "orange" : "red";
@@ -168,6 +200,8 @@ try:
                         <span style="font-weight: bold;">Sqft:</span> ${sqft} sqft<br>
                         <span style="font-weight: bold;">Psf:</span> $${parseFloat(psf).toFixed(2)}<br>
                         <span style="font-weight: bold;">Remaining Lease:</span> ${lease} years
+                        ${mrt_station ? `<br><span style="font-weight: bold;">MRT:</span> ${mrt_station} (${mrt_m} m)` : ""}
+                        ${amenities}
                     </p>
                 </div>
             `;
@@ -183,7 +217,9 @@ try:
             marker.bindTooltip(html, {sticky: true});
             return marker;
         }
-    """
+    """.replace(
+        "AMENITY_LABELS", json.dumps([features[col] for col in tooltip_features])
+    )
 
     if show_all:
         filtered_data = filtered_sub
@@ -212,6 +248,9 @@ try:
                 "floor_area_sqft",
                 "remaining_lease_years",
                 "cat_resale_price",
+                "mrt_station",
+                "mrt_m",
+                *tooltip_features,
             ]
         )
         .to_numpy()
@@ -18,6 +18,7 @@ sf = SidebarFilter(
     select_street=True,
     select_storey=True,
     default_town="ANG MO KIO",
+    columns=["month", "psf", "remaining_lease_years", "address", "storey_range"],
 )
 
 # block_filter = sorted(sf.df["block"].unique())
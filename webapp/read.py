@@ -1,11 +1,16 @@
-from datetime import datetime
+import json
+from datetime import date, datetime
 from pathlib import Path
 
 import polars as pl
 import streamlit as st
 from pybadges import badge
 
-from webapp.utils import get_project_root
+from webapp.utils import get_file_version, get_project_root
+
+STORE_DIR = "store"
+DICTIONARY_FILE = "dictionary.json"
+SNAPSHOT_FILE = "resale.arrow"
 
 
 def get_last_updated_badge(subdir: str = "Resale Flat Prices"):
@@ -22,16 +27,6 @@ def get_last_updated_badge(subdir: str = "Resale Flat Prices"):
     )
 
 
-def convert_lease(x):
-    if 0 < x <= 60:
-        result = "0-60 years"
-    elif 60 < x <= 80:
-        result = "61-80 years"
-    elif 80 < x <= 99:
-        result = "81-99 years"
-    return result
-
-
 def get_dataframe_from_csv(
     subdir: str = "Resale Flat Prices", file_pattern="20*.csv"
 ) -> pl.DataFrame:
@@ -42,44 +37,143 @@ def get_dataframe_from_csv(
     return df
 
 
+def get_partition_path(store_dir: Path, month: str) -> Path:
+    """Return the hive-style (year=/month=) partition file for a YYYY-MM month."""
+    year, month = month.split("-")
+    return store_dir / f"year={year}" / f"month={month}" / "data.parquet"
+
+
+def get_store_dir(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / STORE_DIR
+
+
+def get_store_months(subdir: str = "Resale Flat Prices") -> list[date]:
+    """List the months present in the partitioned store, oldest first."""
+    months = []
+    for path in get_store_dir(subdir).glob("year=*/month=*/data.parquet"):
+        year = int(path.parent.parent.name.removeprefix("year="))
+        month = int(path.parent.name.removeprefix("month="))
+        months.append(date(year, month, 1))
+    return sorted(months)
+
+
+def get_enum_schema(subdir: str = "Resale Flat Prices") -> dict[str, pl.Enum]:
+    """
+    Build the Enum dtypes for the low-cardinality columns from the dictionary
+    saved alongside the store. Partitions hold plain strings, so the dictionary
+    can grow without rewriting old partitions.
+    """
+    dictionary_file = get_store_dir(subdir) / DICTIONARY_FILE
+    if not dictionary_file.exists():
+        return {}
+    with open(dictionary_file) as file:
+        dictionary = json.load(file)
+    return {col: pl.Enum(values) for col, values in dictionary.items()}
+
+
+def to_date(value) -> date:
+    """Accept a date, datetime or YYYY-MM(-DD) string and return a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value[:7], "%Y-%m").date()
+
+
+def scan_dataframe(
+    start_date=None,
+    end_date=None,
+    subdir: str = "Resale Flat Prices",
+    predicate: pl.Expr = None,
+) -> pl.LazyFrame:
+    """
+    Lazily scan the partitioned store between start_date and end_date (inclusive).
+
+    Only the month partitions whose first day falls inside the range are opened,
+    which matches filtering the month column against the same dates. Rows come
+    back sorted by month, town and flat_type, the order the ETL writes them in.
+
+    predicate is applied to the plain string columns before the Enum cast, so it
+    is pushed into the parquet reader.
+    """
+    start_date = to_date(start_date) if start_date else date.min
+    end_date = to_date(end_date) if end_date else date.max
+
+    months = get_store_months(subdir)
+    if not months:
+        raise FileNotFoundError(f"No partitions found in {get_store_dir(subdir)}")
+
+    store_dir = get_store_dir(subdir)
+    enum_schema = get_enum_schema(subdir)
+    paths = [
+        get_partition_path(store_dir, f"{month:%Y-%m}")
+        for month in months
+        if start_date <= month <= end_date
+    ]
+    if not paths:
+        paths = [get_partition_path(store_dir, f"{months[0]:%Y-%m}")]
+        return pl.scan_parquet(paths).cast(enum_schema).clear()
+    lf = pl.scan_parquet(paths)
+    if predicate is not None:
+        lf = lf.filter(predicate)
+    return lf.cast(enum_schema)
+
+
 def get_dataframe_from_parquet(
-    subdir: str = "Resale Flat Prices", filename="df.parquet"
+    start_date=None, end_date=None, subdir: str = "Resale Flat Prices"
 ) -> pl.DataFrame:
-    """Combine all CSV files in the specified directory into a single DataFrame."""
-    data_dir: Path = get_project_root() / "data"
+    """Read the partitions between start_date and end_date into a single DataFrame."""
+    return scan_dataframe(start_date, end_date, subdir).collect()
 
-    df = pl.read_parquet(data_dir / subdir / filename)
-    return df.sort(by="town")
 
+def get_snapshot_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / SNAPSHOT_FILE
 
-def add_time_filters(df: pl.DataFrame):
-    df = df.with_columns(pl.col("month").str.strptime(pl.Date, "%Y-%m"))
-    df = df.with_columns(
-        pl.col("month").dt.quarter().alias("quarter"),
-        pl.col("month").dt.year().alias("year"),
-    )
 
-    df = df.with_columns(
-        (
-            pl.concat_str(
-                [
-                    pl.col("year").cast(str),
-                    pl.col("quarter")
-                    .cast(str)
-                    .map_elements(lambda x: f" Q{x}", return_dtype=str),
-                ]
-            ).alias("quarter_label")
-        )
-    )
-    return df
+def get_snapshot_version(subdir: str = "Resale Flat Prices") -> int | None:
+    """Modification time of the snapshot, used to reopen it after the ETL runs."""
+    return get_file_version(get_snapshot_path(subdir))
 
 
-@st.cache_data(ttl=3600)
-def load_dataframe() -> pl.DataFrame:
-    """Wrapper for get_dataframe that provides a cache"""
-    df = get_dataframe_from_parquet()
-    df = add_time_filters(df)
-    return df
+@st.cache_resource(ttl=3600, max_entries=1)
+def open_dataset(subdir: str = "Resale Flat Prices", version: int = None):
+    """
+    Open the full dataset once per process, sorted by month.
+
+    The Arrow IPC snapshot is memory-mapped, so its buffers live in the page
+    cache and are shared by every session and every worker process on the host
+    instead of being copied onto each one's heap. Falls back to reading the
+    parquet store when the snapshot has not been built yet.
+    """
+    path = get_snapshot_path(subdir)
+    if version is not None and path.exists():
+        return pl.read_ipc(path, memory_map=True)
+    return get_dataframe_from_parquet(subdir=subdir)
+
+
+def load_dataframe(
+    start_date=None, end_date=None, subdir: str = "Resale Flat Prices"
+) -> pl.DataFrame:
+    """
+    Return the months between start_date and end_date (inclusive) as a
+    zero-copy slice of the shared dataset. Callers must not modify it in place.
+    """
+    df = open_dataset(subdir, get_snapshot_version(subdir))
+    return slice_months(df, start_date, end_date)
+
+
+def slice_months(df: pl.DataFrame, start_date=None, end_date=None) -> pl.DataFrame:
+    """
+    Return the months between start_date and end_date (inclusive) of df,
+    which must be sorted by month, as a zero-copy slice.
+    """
+    start = df["month"].search_sorted(to_date(start_date)) if start_date else 0
+    end = (
+        df["month"].search_sorted(to_date(end_date), side="right")
+        if end_date
+        else df.height
+    )
+    return df.slice(start, max(end - start, 0))
 
 
 @st.cache_data
@@ -113,3 +207,14 @@ schema = {
     "longitude": pl.Float32,
     "_ts": pl.Utf8,
 }
+
+# stored as strings, loaded as pl.Enum using the store dictionary
+enum_columns = [
+    "town",
+    "flat_type",
+    "flat_model",
+    "storey_range",
+    "street_name",
+    "cat_remaining_lease_years",
+    "address",
+]
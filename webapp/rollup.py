@@ -0,0 +1,250 @@
+import math
+from dataclasses import replace
+from pathlib import Path
+
+import polars as pl
+
+from webapp.filter import FilterSpec
+from webapp.utils import get_build_id, get_project_root, load_parquet
+
+ROLLUP_FILE = "rollup.parquet"
+SKETCH_FILE = "rollup_sketch.parquet"
+
+# Quantile sketch: every value x > 0 is counted in the logarithmic bin
+# i = ceil(log_gamma(x)) and read back as 2 * gamma**i / (gamma + 1). Any value
+# in the bin is then within SKETCH_ACCURACY of the read-back value, relative to
+# the value itself. Bins from different cells are merged by adding counts, so
+# the k-th smallest value of any union of cells, and hence any quantile built
+# from ranks, comes back within SKETCH_ACCURACY (0.5%) of the exact figure.
+SKETCH_ACCURACY = 0.005
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_METRICS = ["resale_price", "psf"]
+
+# one cell per combination; storey_lower_bound is a function of storey_range
+ROLLUP_KEYS = [
+    "quarter_label",
+    "town",
+    "flat_type",
+    "cat_remaining_lease_years",
+    "storey_range",
+    "storey_lower_bound",
+]
+
+# Grouping sets materialised in the cube, coarsest first. A query is served
+# from the first level that has every column it groups or filters by, so the
+# common views merge a few thousand sketch bins instead of every cell.
+ROLLUP_LEVELS = [
+    ["quarter_label"],
+    ["quarter_label", "flat_type"],
+    ["quarter_label", "cat_remaining_lease_years"],
+    ["quarter_label", "town"],
+    ["quarter_label", "town", "flat_type", "cat_remaining_lease_years"],
+    ROLLUP_KEYS,
+]
+
+
+def to_sketch_bin(value: pl.Expr) -> pl.Expr:
+    return (value.log() / math.log(SKETCH_GAMMA)).ceil().cast(pl.Int32)
+
+
+def from_sketch_bin(index: pl.Expr) -> pl.Expr:
+    return 2 * pl.lit(SKETCH_GAMMA).pow(index) / (SKETCH_GAMMA + 1)
+
+
+def get_sketch_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / SKETCH_FILE
+
+
+def get_rollup_path(subdir: str = "Resale Flat Prices") -> Path:
+    return get_project_root() / "data" / subdir / ROLLUP_FILE
+
+
+def get_cube_build(subdir: str = "Resale Flat Prices") -> str | None:
+    """The build id of the rollup when its sketch is from the same build."""
+    build = get_build_id(get_rollup_path(subdir))
+    if build is None or get_build_id(get_sketch_path(subdir)) != build:
+        return None
+    return build
+
+
+def load_cube(subdir: str = "Resale Flat Prices") -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Read the rollup cube and its sketch bins (cell, metric, bin, count) from
+    the same build. Cells are numbered per build, so both are empty while the
+    files on disk are from different builds or missing.
+    """
+    build = get_cube_build(subdir)
+    if build is None:
+        return pl.DataFrame(), pl.DataFrame()
+    cube = load_parquet(get_rollup_path(subdir), build)
+    sketch = load_parquet(get_sketch_path(subdir), build)
+    if cube.is_empty() or sketch.is_empty():
+        return pl.DataFrame(), pl.DataFrame()
+    return cube, sketch
+
+
+def merge_sketches(
+    cells: pl.DataFrame, sketch: pl.DataFrame, by: list[str], quantile: float = 0.5
+) -> pl.DataFrame:
+    """
+    Merge the sketches of the given rollup cells per group and read back a
+    quantile of each metric as <metric>_q<percent>, e.g. psf_q50. sketch is
+    the one load_cube returned with the cube the cells come from.
+
+    Quantiles interpolate linearly between the two nearest ranks, like
+    polars' median() and quantile(..., "linear").
+    """
+    suffix = f"_q{round(quantile * 100)}"
+    if cells.is_empty():
+        # an empty pivot has no metric columns, so give them explicitly
+        return cells.select(by).with_columns(
+            pl.lit(None, pl.Float64).alias(metric + suffix) for metric in SKETCH_METRICS
+        )
+
+    groups = by + ["metric"]
+    rank = (pl.col("n") - 1) * quantile
+    # the sketch is sorted by cell and a level's cells are numbered
+    # contiguously, so only the slice covering the selected cells is joined
+    start = sketch["cell"].search_sorted(cells["cell"].min(), side="left")
+    end = sketch["cell"].search_sorted(cells["cell"].max(), side="right")
+    merged = (
+        sketch.slice(start, end - start)
+        .join(cells.select(["cell"] + by), on="cell")
+        .group_by(groups + ["bin"])
+        .agg(pl.sum("count"))
+        .sort("bin")
+        .with_columns(
+            pl.col("count").cum_sum().over(groups).alias("seen"),
+            pl.col("count").sum().over(groups).alias("n"),
+        )
+        .group_by(groups)
+        .agg(
+            pl.col("bin").filter(pl.col("seen") > rank.floor()).first().alias("lo"),
+            pl.col("bin").filter(pl.col("seen") > rank.ceil()).first().alias("hi"),
+            (rank - rank.floor()).first().alias("frac"),
+        )
+        .with_columns(
+            lo=from_sketch_bin(pl.col("lo")),
+            hi=from_sketch_bin(pl.col("hi")),
+        )
+        .select(
+            *by,
+            pl.col("metric") + suffix,
+            (pl.col("lo") + (pl.col("hi") - pl.col("lo")) * pl.col("frac")).alias(
+                "value"
+            ),
+        )
+    )
+    return merged.pivot("metric", index=by, values="value")
+
+
+def get_selection(spec: FilterSpec, lease_years: bool = True):
+    """Return (inside, outside) predicates on the cell month and lease spans."""
+    inside = (pl.col("first_month") >= spec.start_date) & (
+        pl.col("last_month") <= spec.end_date
+    )
+    outside = (pl.col("last_month") < spec.start_date) | (
+        pl.col("first_month") > spec.end_date
+    )
+    if lease_years and spec.lease_years:
+        start, end = spec.lease_years
+        inside &= (pl.col("lease_years_min") >= start) & (
+            pl.col("lease_years_max") <= end
+        )
+        outside |= (pl.col("lease_years_max") < start) | (
+            pl.col("lease_years_min") > end
+        )
+    return inside, outside
+
+
+def query_rollup(
+    spec: FilterSpec, by: list[str], cube: pl.DataFrame = None
+) -> pl.DataFrame | None:
+    """
+    Return the rollup cells selected by spec, from the coarsest level that
+    has all of the by columns. cube defaults to the one load_cube returns.
+
+    A cell spans a quarter and a range of remaining lease years, while the
+    sidebar selects months and single years. The rollup only answers a spec
+    when every cell is either fully inside or fully outside the selection;
+    otherwise None is returned and callers fall back to the raw rows.
+    """
+    if cube is None:
+        cube = load_cube()[0]
+    if cube.is_empty() or spec.streets:
+        return None
+
+    # storey and lease selections that exclude nothing need no level support
+    finest = cube.filter(pl.col("level") == len(ROLLUP_LEVELS) - 1)
+    _, outside = get_selection(spec, lease_years=False)
+    finest = finest.filter(replace(spec, storey=None).to_category_expr() & ~outside)
+    if spec.storey and finest["storey_lower_bound"].is_between(*spec.storey).all():
+        spec = replace(spec, storey=None)
+    finest = finest.filter(spec.to_category_expr())
+    if spec.lease_years and finest.filter(~get_selection(spec)[0]).is_empty():
+        spec = replace(spec, lease_years=None)
+
+    required = set(by)
+    if spec.flat_type != "ALL":
+        required.add("flat_type")
+    if spec.towns:
+        required.add("town")
+    if spec.storey:
+        required.add("storey_range")
+    if spec.lease_years:
+        required.add("cat_remaining_lease_years")
+
+    inside, outside = get_selection(spec)
+    for level, keys in enumerate(ROLLUP_LEVELS):
+        if not required.issubset(keys):
+            continue
+        cells = cube.filter((pl.col("level") == level) & spec.to_category_expr())
+        if cells.filter(~inside & ~outside).is_empty():
+            return cells.filter(inside)
+    return None
+
+
+def aggregate(spec: FilterSpec, df: pl.DataFrame, by: list[str]) -> pl.DataFrame:
+    """
+    Transaction count, sum, min, max and median of resale_price and psf per
+    group.
+
+    Served from the rollup and its sketches when the rollup answers spec,
+    otherwise from the rows in df. Both paths return the same columns; medians
+    from the rollup are within SKETCH_ACCURACY of the exact ones.
+    """
+    cube, sketch = load_cube()
+    cells = query_rollup(spec, by, cube)
+    if cells is None:
+        return df.group_by(by).agg(
+            pl.len().alias("txn_count"),
+            pl.col("resale_price").cast(pl.Float64).sum().alias("resale_price_sum"),
+            pl.min("resale_price").alias("resale_price_min"),
+            pl.max("resale_price").alias("resale_price_max"),
+            pl.median("resale_price").cast(pl.Float64).alias("resale_price_q50"),
+            pl.col("psf").cast(pl.Float64).sum().alias("psf_sum"),
+            pl.min("psf").alias("psf_min"),
+            pl.max("psf").alias("psf_max"),
+            pl.median("psf").cast(pl.Float64).alias("psf_q50"),
+        )
+    totals = cells.group_by(by).agg(
+        pl.sum("txn_count").cast(pl.UInt32),
+        pl.sum("resale_price_sum"),
+        pl.min("resale_price_min"),
+        pl.max("resale_price_max"),
+        pl.sum("psf_sum"),
+        pl.min("psf_min"),
+        pl.max("psf_max"),
+    )
+    return totals.join(merge_sketches(cells, sketch, by), on=by).select(
+        *by,
+        "txn_count",
+        "resale_price_sum",
+        "resale_price_min",
+        "resale_price_max",
+        "resale_price_q50",
+        "psf_sum",
+        "psf_min",
+        "psf_max",
+        "psf_q50",
+    )
@@ -0,0 +1,115 @@
+import re
+from collections import defaultdict
+
+# long forms mapped to the abbreviations HDB uses in its street names
+STREET_ABBREVIATIONS = {
+    "AVENUE": "AVE",
+    "STREET": "ST",
+    "ROAD": "RD",
+    "DRIVE": "DR",
+    "CRESCENT": "CRES",
+    "CENTRAL": "CTRL",
+    "NORTH": "NTH",
+    "SOUTH": "STH",
+    "LORONG": "LOR",
+    "JALAN": "JLN",
+    "BUKIT": "BT",
+    "UPPER": "UPP",
+    "CLOSE": "CL",
+    "PARK": "PK",
+    "PLACE": "PL",
+    "GARDENS": "GDNS",
+    "GARDEN": "GDN",
+    "HEIGHTS": "HTS",
+    "TERRACE": "TER",
+    "KAMPONG": "KG",
+    "TANJONG": "TG",
+    "COMMONWEALTH": "CWEALTH",
+    "SAINT": "ST",
+    "CENTRE": "CTR",
+    "MARKET": "MKT",
+}
+
+# words that tell apart streets with otherwise similar names, such as BOON
+# KENG RD and UPP BOON KENG RD a kilometre away; like the numbers in a
+# street, a fuzzy match must keep them all
+STREET_QUALIFIERS = {"UPP", "LOR", "JLN", "NTH", "STH", "EAST", "WEST", "CTRL"}
+
+# a fuzzy match needs this trigram similarity, and must beat the runner-up
+MATCH_THRESHOLD = 0.6
+MATCH_MARGIN = 0.1
+
+
+def normalise_address(address: str) -> str:
+    """
+    Canonical form of a "<block> <street>" address: upper case, no
+    punctuation, single spaces, no BLK prefix, abbreviations as HDB writes them.
+    """
+    address = address.upper().replace("'", "")
+    address = re.sub(r"[^\w\s]", " ", address)
+    # "AVE3" -> "AVE 3", but keep blocks like "102D"
+    address = re.sub(r"(?<=[A-Z]{2})(?=\d)", " ", address)
+    tokens = address.split()
+    if tokens and tokens[0] in ("BLK", "BLOCK"):
+        tokens = tokens[1:]
+    return " ".join(STREET_ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def get_trigrams(text: str) -> set[str]:
+    text = f"  {text} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def get_street_key(street: str) -> tuple[str, ...]:
+    """The numbers and STREET_QUALIFIERS of a street, in order."""
+    return tuple(
+        token
+        for token in street.split()
+        if token[0].isdigit() or token in STREET_QUALIFIERS
+    )
+
+
+def build_address_index(addresses: list[str]) -> dict:
+    """
+    Index known addresses by normalised form, and by block and street key
+    for fuzzy street matching with character trigrams.
+    """
+    exact = {}
+    by_block = defaultdict(list)
+    for address in addresses:
+        normalised = normalise_address(address)
+        exact.setdefault(normalised, address)
+        block, _, street = normalised.partition(" ")
+        by_block[block, get_street_key(street)].append((get_trigrams(street), address))
+    return {"exact": exact, "by_block": by_block}
+
+
+def match_address(index: dict, address: str) -> str | None:
+    """
+    Return the known address that address refers to, or None.
+
+    The normalised form is tried first. Otherwise the block and the numbers
+    and qualifiers in the street (e.g. the UPP and 3 in "UPP SERANGOON AVE 3")
+    must match exactly, and the street must be clearly the closest one among
+    those.
+    """
+    normalised = normalise_address(address)
+    if normalised in index["exact"]:
+        return index["exact"][normalised]
+
+    block, _, street = normalised.partition(" ")
+    grams = get_trigrams(street)
+    scores = sorted(
+        (
+            (len(grams & candidate) / len(grams | candidate), known)
+            for candidate, known in index["by_block"].get(
+                (block, get_street_key(street)), []
+            )
+        ),
+        reverse=True,
+    )
+    if not scores or scores[0][0] < MATCH_THRESHOLD:
+        return None
+    if len(scores) > 1 and scores[0][0] - scores[1][0] < MATCH_MARGIN:
+        return None
+    return scores[0][1]
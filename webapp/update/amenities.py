@@ -0,0 +1,145 @@
+import time
+
+import polars as pl
+
+from webapp.amenities import AMENITY_FILE
+from webapp.layers import LAYER_DIR, load_layer
+from webapp.read import scan_dataframe
+from webapp.update.geocoding import get_map_results
+from webapp.update.spatial import GridIndex, to_metres
+from webapp.utils import get_project_root
+
+SCHOOLS_FILE = "General information of schools.CSV"
+
+# point layers: file and the property naming each feature, if any
+LAYERS = {
+    "mrt": ("LTA MRT Station Exit GEOJSON.GEOJSON", "STATION_NA"),
+    "bus_stop": ("LTA Bus Stop.GEOJSON", "BUS_STOP_NUM"),
+    "hawker": ("Hawker Centres GEOJSON.GEOJSON", "NAME"),
+    "supermarket": ("Supermarkets GEOJSON.GEOJSON", "LIC_NAME"),
+    "park": ("Parks.GEOJSON", "NAME"),
+}
+
+BUS_STOP_RADIUS = 400  # metres, about a five minute walk
+SCHOOL_RADIUS = 1000  # metres, the distance used in primary school ballots
+
+
+def load_points(file_name: str, name_property: str = None) -> pl.DataFrame:
+    """The Point features of a cached layer as (name, latitude, longitude)."""
+    if not (LAYER_DIR / file_name).exists():
+        print(f"Amenity layer {file_name} not found, skipping")
+        return pl.DataFrame(
+            schema={"name": pl.Utf8, "latitude": pl.Float64, "longitude": pl.Float64}
+        )
+
+    return (
+        load_layer(file_name)
+        .filter(pl.col("geometry_type") == "Point")
+        .select(
+            (pl.col(name_property) if name_property else pl.lit(None))
+            .cast(pl.Utf8)
+            .alias("name"),
+            "latitude",
+            "longitude",
+        )
+    )
+
+
+def load_primary_schools() -> pl.DataFrame:
+    """
+    Locate the schools that take primary pupils. The school list has addresses
+    but no coordinates, so they go through the geocoding cache; only the
+    first build queries the geocoder.
+    """
+    path = LAYER_DIR / SCHOOLS_FILE
+    if not path.exists():
+        print(f"{SCHOOLS_FILE} not found, skipping schools")
+        return pl.DataFrame(
+            schema={"name": pl.Utf8, "latitude": pl.Float64, "longitude": pl.Float64}
+        )
+
+    schools = (
+        pl.read_csv(path, columns=["school_name", "address", "mainlevel_code"])
+        .filter(pl.col("mainlevel_code").str.contains("PRIMARY|P1"))
+        .with_columns(pl.col("address").str.strip_chars().str.replace_all(r"\s+", " "))
+    )
+    coords = get_map_results(schools.select("address").unique())
+    located = schools.join(coords, on="address", how="left")
+    missing = located["latitude"].null_count()
+    if missing:
+        print(f"{missing} of {len(located)} primary schools have no coordinates")
+    return located.drop_nulls("latitude").select(
+        pl.col("school_name").alias("name"), "latitude", "longitude"
+    )
+
+
+def build_amenities(subdir: str = "Resale Flat Prices"):
+    """
+    Compute amenity features for every address in the store: distance to and
+    name of the nearest MRT exit, bus stops within BUS_STOP_RADIUS, distance
+    to the nearest hawker centre, supermarket and park, and primary schools
+    within SCHOOL_RADIUS. Distances are straight-line metres.
+    """
+    start = time.perf_counter()
+    addresses = (
+        scan_dataframe(subdir=subdir)
+        .select(pl.col("address").cast(pl.Utf8), "latitude", "longitude")
+        .drop_nulls()
+        .unique(subset="address")
+        .sort("address")
+        .collect()
+    )
+    xy = to_metres(addresses["latitude"].to_numpy(), addresses["longitude"].to_numpy())
+
+    layers = {name: load_points(*layer) for name, layer in LAYERS.items()}
+    layers["primary_school"] = load_primary_schools()
+    # a layer that is missing or could not be geocoded would null its column
+    # for every address; keep the last complete file instead
+    empty = [name for name, layer in layers.items() if layer.is_empty()]
+    if empty:
+        print(f"No points for {', '.join(empty)}, not writing amenity features")
+        return None
+    # sparse layers are searched faster with larger cells, as the nearest point
+    # is then found in fewer rings
+    index = {
+        name: GridIndex(
+            to_metres(layer["latitude"].to_numpy(), layer["longitude"].to_numpy()),
+            cell=250 if len(layer) > 2000 else 1000,
+        )
+        for name, layer in layers.items()
+    }
+
+    def nearest(name: str) -> tuple[pl.Series, pl.Series]:
+        dist, idx = index[name].nearest(xy)
+        return pl.Series(dist).round(0).cast(pl.Int32), layers[name]["name"].gather(idx)
+
+    def count_within(name: str, radius: float) -> pl.Series:
+        return pl.Series(index[name].count_within(xy, radius), dtype=pl.Int16)
+
+    mrt_m, mrt_station = nearest("mrt")
+    hawker_m, hawker_centre = nearest("hawker")
+    amenities = addresses.select("address").with_columns(
+        mrt_m=mrt_m,
+        mrt_station=mrt_station,
+        bus_stops_400m=count_within("bus_stop", BUS_STOP_RADIUS),
+        hawker_m=hawker_m,
+        hawker_centre=hawker_centre,
+        supermarket_m=nearest("supermarket")[0],
+        park_m=nearest("park")[0],
+        primary_schools_1km=count_within("primary_school", SCHOOL_RADIUS),
+    )
+
+    file_path = get_project_root() / "data" / subdir / AMENITY_FILE
+    # swap in a complete file; the app may be reading the previous one
+    tmp_path = file_path.with_suffix(".tmp")
+    amenities.write_parquet(tmp_path)
+    tmp_path.replace(file_path)
+    print(
+        f"Wrote amenity features for {amenities.height} addresses to {file_path} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return amenities
+
+
+if __name__ == "__main__":
+    build_amenities()
@@ -0,0 +1,53 @@
+import streamlit as st
+
+from webapp.heatmap import get_grid_path, get_streets_path
+from webapp.read import get_snapshot_path, get_store_months
+from webapp.rollup import get_cube_build, get_rollup_path, get_sketch_path
+from webapp.update.convert import csv_to_parquet, write_snapshot
+from webapp.update.heatmap import build_heatmap_grid
+from webapp.update.manifest import get_dirty_months
+from webapp.update.rollup import build_rollup
+
+
+def build_dataset(subdir: str = "Resale Flat Prices", months: list[str] = None):
+    """
+    Rebuild the store partitions of months (every month when None) from the
+    CSVs, then the snapshot, rollup and heatmap pyramid derived from the
+    whole store. None of these files are committed.
+    """
+    csv_to_parquet(subdir, months=months)
+    write_snapshot(subdir)
+    build_rollup(subdir)
+    build_heatmap_grid(subdir)
+
+
+def get_derived_paths(subdir: str = "Resale Flat Prices"):
+    return [
+        get_snapshot_path(subdir),
+        get_rollup_path(subdir),
+        get_sketch_path(subdir),
+        get_grid_path(subdir),
+        get_streets_path(subdir),
+    ]
+
+
+@st.cache_resource(show_spinner="Building the dataset...")
+def ensure_dataset(subdir: str = "Resale Flat Prices", version: int = None):
+    """
+    Build whatever the committed CSVs need at app start: everything on a fresh
+    checkout, or the months whose CSVs changed since the store was built.
+    version is that of the CSV manifest, so a new commit is checked again.
+    """
+    if not get_store_months(subdir):
+        build_dataset(subdir)
+        return
+    dirty_months = get_dirty_months(subdir)
+    if dirty_months or not all(path.exists() for path in get_derived_paths(subdir)):
+        build_dataset(subdir, months=dirty_months)
+    elif get_cube_build(subdir) is None:
+        # a rollup written without its sketch, e.g. by an interrupted build
+        build_rollup(subdir)
+
+
+if __name__ == "__main__":
+    build_dataset()
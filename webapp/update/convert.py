@@ -1,28 +1,102 @@
+import json
 from pathlib import Path
 
 import polars as pl
 
-from webapp.read import schema
+from webapp.read import (
+    DICTIONARY_FILE,
+    enum_columns,
+    get_partition_path,
+    get_snapshot_path,
+    get_store_dir,
+    get_store_months,
+    scan_dataframe,
+    schema,
+)
+from webapp.update.manifest import mark_converted
 from webapp.utils import get_project_root
 
+# Rows are clustered by these columns inside each month partition. Partitions
+# hold 0.4-3k rows and are written as one row group: splitting them so the
+# statistics skip groups sped up town filters but slowed every other scan
+# more (see benchmarks/clustered_store.py).
+CLUSTER_KEYS = ["month", "town", "flat_type"]
+ROW_GROUP_SIZE = 4096
 
-def convert_lease(x):
-    if 0 < x <= 60:
-        result = "0-60 years"
-    elif 60 < x <= 80:
-        result = "61-80 years"
-    elif 80 < x <= 99:
-        result = "81-99 years"
-    return result
 
+def get_lease_category(col: pl.Expr) -> pl.Expr:
+    return (
+        pl.when((col > 0) & (col <= 60))
+        .then(pl.lit("0-60 years"))
+        .when((col > 60) & (col <= 80))
+        .then(pl.lit("61-80 years"))
+        .when((col > 80) & (col <= 99))
+        .then(pl.lit("81-99 years"))
+    )
 
-def csv_to_parquet(subdir) -> pl.DataFrame:
-    """Combine all CSV files in the specified directory into a single parquet file"""
-    data_dir: Path = get_project_root() / "data"
 
-    df = pl.read_csv(data_dir / subdir / "20*.csv", schema=schema)
+def write_partitions(df: pl.DataFrame, store_dir: Path):
+    """
+    Write one parquet file per month under store_dir/year=YYYY/month=MM/,
+    sorted by CLUSTER_KEYS, with row group statistics and a page index.
+    """
+    for (month,), part in df.group_by("month"):
+        path = get_partition_path(store_dir, f"{month:%Y-%m}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write next to the target and swap in, so readers never see a partial file
+        tmp_path = path.with_suffix(".tmp")
+        part.sort(by=CLUSTER_KEYS + ["_ts"]).write_parquet(
+            tmp_path,
+            compression="zstd",
+            row_group_size=ROW_GROUP_SIZE,
+            use_pyarrow=True,
+            pyarrow_options={"write_statistics": True, "write_page_index": True},
+        )
+        tmp_path.replace(path)
 
-    df = df.unique()
+
+def update_dictionary(df: pl.DataFrame, store_dir: Path):
+    """
+    Merge the values of the Enum columns into the store dictionary.
+
+    Values are only ever added, and each list is kept sorted so the Enum
+    order matches the plain string order the pages sort by.
+    """
+    dictionary_file = store_dir / DICTIONARY_FILE
+    dictionary = {}
+    if dictionary_file.exists():
+        with open(dictionary_file) as file:
+            dictionary = json.load(file)
+
+    for col in enum_columns:
+        values = set(dictionary.get(col, []))
+        values.update(df[col].drop_nulls().unique())
+        dictionary[col] = sorted(values)
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    # readers load the dictionary on every scan, so swap in a complete file
+    tmp_path = dictionary_file.with_suffix(".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(dictionary, file, indent=2)
+    tmp_path.replace(dictionary_file)
+
+
+def add_time_columns(df: pl.DataFrame) -> pl.DataFrame:
+    """Parse month into a Date and derive year, quarter and quarter_label."""
+    df = df.with_columns(pl.col("month").str.strptime(pl.Date, "%Y-%m"))
+    df = df.with_columns(
+        pl.col("month").dt.quarter().alias("quarter"),
+        pl.col("month").dt.year().alias("year"),
+    )
+    df = df.with_columns(
+        pl.format("{} Q{}", pl.col("year"), pl.col("quarter")).alias("quarter_label")
+    )
+    return df
+
+
+def add_derived_columns(df: pl.DataFrame) -> pl.DataFrame:
+    """Compute time, lease, area, psf and storey columns from the raw CSV columns."""
+    df = add_time_columns(df)
     df = df.with_columns(
         (
             pl.col("remaining_lease")
@@ -33,15 +107,19 @@ def csv_to_parquet(subdir) -> pl.DataFrame:
     )
 
     df = df.with_columns(
-        pl.col("remaining_lease_years")
-        .map_elements(convert_lease, pl.String)
-        .alias("cat_remaining_lease_years")
+        get_lease_category(pl.col("remaining_lease_years")).alias(
+            "cat_remaining_lease_years"
+        )
     )
 
     df = df.with_columns(
         [
-            (pl.col("floor_area_sqm") * 10.7639).alias("floor_area_sqft").cast(pl.Int16),
-            (pl.col("resale_price") / (pl.col("floor_area_sqm") * 10.7639)).alias("psf"),
+            (pl.col("floor_area_sqm") * 10.7639)
+            .alias("floor_area_sqft")
+            .cast(pl.Int16),
+            (pl.col("resale_price") / (pl.col("floor_area_sqm") * 10.7639)).alias(
+                "psf"
+            ),
         ]
     )
 
@@ -60,10 +138,55 @@ def csv_to_parquet(subdir) -> pl.DataFrame:
         ]
     )
 
-    df = df.sort(by="_ts")
-    df.write_parquet(data_dir / subdir / "df.parquet")
+    return df
+
+
+def csv_to_parquet(subdir: str = "Resale Flat Prices", months: list[str] = None):
+    """
+    Combine the monthly CSV files in the specified directory into a
+    month-partitioned parquet store.
+
+    If months is given, only those months are re-read and their partitions
+    replaced; every other partition is left untouched. A full rebuild is done
+    when months is None or the store is still empty.
+    """
+    data_dir: Path = get_project_root() / "data"
+    store_dir = get_store_dir(subdir)
+
+    if months is None or not get_store_months(subdir):
+        files = [data_dir / subdir / "20*.csv"]
+    else:
+        files = [data_dir / subdir / f"{month}.csv" for month in sorted(months)]
+        files = [file for file in files if file.exists()]
+        if not files:
+            return
+
+    df = pl.scan_csv(files, schema=schema).collect()
+    df = df.unique()
+    df = add_derived_columns(df)
+
+    update_dictionary(df, store_dir)
+    write_partitions(df, store_dir)
+    mark_converted([f"{month:%Y-%m}" for month in df["month"].unique()], subdir)
+    print(f"Wrote {df['month'].n_unique()} partition(s) to {store_dir}")
     return
 
 
+def write_snapshot(subdir: str = "Resale Flat Prices"):
+    """
+    Write the whole store to an uncompressed Arrow IPC file, so the app can
+    memory-map it and slice date ranges without copying. The store is read in
+    partition order, which keeps the rows sorted by CLUSTER_KEYS.
+    """
+    path = get_snapshot_path(subdir)
+    df = scan_dataframe(subdir=subdir).collect()
+    # swap in a complete file; processes holding the old mapping keep the old inode
+    tmp_path = path.with_suffix(".tmp")
+    df.write_ipc(tmp_path, compression="uncompressed")
+    tmp_path.replace(path)
+    print(f"Wrote {df.height} rows to {path}")
+
+
 if __name__ == "__main__":
     csv_to_parquet()
+    write_snapshot()
@@ -1,8 +1,14 @@
 import requests
 import json
 import datetime
+import hashlib
 import pathlib
-from webapp.utils import get_project_root
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from webapp.utils import get_dataset_filename, get_project_root
+from webapp.update.httpcache import CACHE_TTL, cached_get_json
 from typing import Optional, Dict, Any
 
 BASE_SEARCH_URL = "https://data.gov.sg/api/action/datastore_search"
@@ -16,50 +22,225 @@ DATASET_DOWNLOAD_URL = (
     "https://api-open.data.gov.sg/v1/public/api/datasets/{}/poll-download"
 )
 
+# file downloads
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = (10, 60)  # connect, and between chunks
+
+# metadata is small and decides what gets downloaded, so it is rechecked sooner
+METADATA_TTL = 60 * 60
+
+# datastore pagination
+PAGE_WORKERS = 4
+PAGE_RETRIES = 3
+PAGE_TIMEOUT = 30
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide datastore session, pooling enough connections for every page worker."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({"User-Agent": "HDB Kaki/1.0"})
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4, pool_maxsize=POOL_SIZE
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def fetch_page(params: dict, offset: int, ttl: float = CACHE_TTL) -> dict:
+    """
+    Fetch one datastore page through the response cache, retrying it on its
+    own with exponential backoff. Raises the last error once PAGE_RETRIES
+    attempts have failed.
+    """
+    session = get_session()
+    for attempt in range(PAGE_RETRIES):
+        try:
+            return cached_get_json(
+                session,
+                BASE_SEARCH_URL,
+                {**params, "offset": offset},
+                ttl=ttl,
+                timeout=PAGE_TIMEOUT,
+            ).get("result", {})
+        except (requests.RequestException, ValueError) as e:
+            if attempt == PAGE_RETRIES - 1:
+                raise
+            wait = 2**attempt
+            print(f"Page at offset {offset} failed ({e}), retrying in {wait}s")
+            time.sleep(wait)
+
+
+def fetch_all_pages(params: dict, ttl: float = CACHE_TTL) -> tuple[list, int]:
+    """Return the records of every page and the total reported by the first one."""
+    first = fetch_page(params, 0, ttl)
+    all_records = first.get("records", [])
+    total = first.get("total")
+    # the server may cap the page size below the limit asked for, so pages
+    # are stepped by the size of the first one it returned
+    page_size = len(all_records)
+
+    if total is None:
+        # no count to plan with: walk the pages until a short one
+        records = all_records
+        while page_size and len(records) == page_size:
+            records = fetch_page(params, len(all_records), ttl).get("records", [])
+            all_records.extend(records)
+        return all_records, len(all_records)
+
+    offsets = range(page_size, total, page_size) if page_size else []
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+        for page in pool.map(lambda offset: fetch_page(params, offset, ttl), offsets):
+            all_records.extend(page.get("records", []))
+    return all_records, total
+
 
 def fetch_data_gov_sg(dataset_id: str, query_params: dict = None) -> list:
     """
     Fetch all records from data.gov.sg for a given dataset ID (datastore API).
-    Handles pagination automatically.
+
+    The first page gives the total record count; the remaining pages are then
+    requested in parallel and joined back in offset order. Raises if a page
+    still fails after its retries or the records do not add up to the total,
+    rather than returning a partial result.
     """
     params = {
         "resource_id": dataset_id,
         "limit": 4000,
-        "offset": 0,
     }  # Maximize batch size (approx 5k limit on API)
     if query_params:
         params.update(query_params)
 
-    all_records = []
+    all_records, total = fetch_all_pages(params)
+    if len(all_records) != total:
+        # cached pages can be from before the data changed: revalidate them all
+        print(f"Cached pages of {dataset_id} are out of step, refetching")
+        all_records, total = fetch_all_pages(params, ttl=0)
 
-    with requests.Session() as session:
-        session.headers.update({"User-Agent": "HDB Kaki/1.0"})
+    if len(all_records) != total:
+        raise RuntimeError(
+            f"Expected {total} records from {dataset_id}, got {len(all_records)}"
+        )
+    return all_records
 
-        while True:
-            try:
-                resp = session.get(BASE_SEARCH_URL, params=params)
-                resp.raise_for_status()
 
-                data = resp.json().get("result", {})
-                records = data.get("records", [])
+def probe_data_gov_sg(dataset_id: str, query_params: dict = None) -> dict:
+    """
+    Return the record total and highest _id matching query_params, from a
+    single one-row, one-field query that bypasses the response cache.
+    """
+    params = {
+        "resource_id": dataset_id,
+        "limit": 1,
+        "fields": "_id",
+        "sort": "_id desc",
+    }
+    if query_params:
+        params.update(query_params)
+
+    result = fetch_page(params, 0, ttl=0)
+    records = result.get("records", [])
+    return {
+        "total": result.get("total"),
+        "max_id": int(records[0]["_id"]) if records else None,
+    }
 
-                if not records:
-                    break
 
-                all_records.extend(records)
+def get_file_hashes(path: pathlib.Path) -> tuple[str, str]:
+    """Return the (md5, sha256) hex digests of a file, reading it in chunks."""
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
 
-                # If we received fewer records than the limit,
-                # we have reached the end of the dataset.
-                if len(records) < params["limit"]:
-                    break
 
-                params["offset"] += len(records)
+def stream_download(
+    session: requests.Session, url: str, output_file: pathlib.Path
+) -> str:
+    """
+    Stream url into output_file in chunks and return the file's sha256.
+
+    Data goes to a .part file next to the target. After a dropped connection
+    the download resumes from the end of the .part file with an HTTP Range
+    request, guarded by If-Range with the ETag; a .part file without an ETag
+    to check it against is discarded. The finished file is checked against
+    the Content-Length and, when the ETag is a plain md5 (as for single-part
+    S3 objects), against that md5. Only then is it renamed over output_file.
+    """
+    part_file = output_file.with_name(output_file.name + ".part")
+    etag = None
+    total = None
+
+    for attempt in range(DOWNLOAD_RETRIES):
+        if part_file.exists() and not etag:
+            # left by an earlier run, or the server sent no ETag: there is
+            # no validator to check the remote file against, so start over
+            part_file.unlink()
+        offset = part_file.stat().st_size if part_file.exists() else 0
+        # only resume if the remote file has not changed since
+        headers = {"Range": f"bytes={offset}-", "If-Range": etag} if offset else {}
+        try:
+            with session.get(
+                url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            ) as resp:
+                if resp.status_code == 416:
+                    # the part file is already complete or no longer matches
+                    part_file.unlink()
+                    continue
+                resp.raise_for_status()
 
-            except Exception as e:
-                print(f"Error downloading data: {e}")
-                break
+                etag = resp.headers.get("ETag", etag)
+                if resp.status_code == 206:
+                    content_range = resp.headers.get("Content-Range", "")
+                    total = int(content_range.rsplit("/", 1)[-1] or 0) or None
+                    mode = "ab"
+                else:
+                    # server ignored the range: start over
+                    length = resp.headers.get("Content-Length")
+                    total = int(length) if length else None
+                    mode = "wb"
+
+                with open(part_file, mode) as f:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            break
+        except requests.RequestException as e:
+            if attempt == DOWNLOAD_RETRIES - 1:
+                raise
+            print(f"  Download interrupted ({e}), resuming...")
+            time.sleep(2**attempt)
+    else:
+        # the last attempt ended in a 416, which removed the part file
+        raise requests.RequestException(
+            f"Could not download {output_file.name} in {DOWNLOAD_RETRIES} attempts"
+        )
 
-    return all_records
+    size = part_file.stat().st_size
+    if total is not None and size != total:
+        raise requests.RequestException(
+            f"Incomplete download of {output_file.name}: {size} of {total} bytes"
+        )
+
+    md5, sha256 = get_file_hashes(part_file)
+    etag = (etag or "").strip('"')
+    if re.fullmatch(r"[0-9a-f]{32}", etag) and etag != md5:
+        part_file.unlink()
+        raise requests.RequestException(
+            f"Checksum mismatch for {output_file.name}: md5 {md5}, ETag {etag}"
+        )
+
+    part_file.replace(output_file)
+    return sha256
 
 
 def download_dataset(
@@ -121,9 +302,9 @@ def download_dataset(
         # 3. Fetch Current Metadata
         meta_url = DATASET_METADATA_URL.format(dataset_id)
         try:
-            resp = local_session.get(meta_url, timeout=30)
-            resp.raise_for_status()
-            current_meta = resp.json().get("data", {})
+            current_meta = cached_get_json(
+                local_session, meta_url, ttl=METADATA_TTL
+            ).get("data", {})
         except requests.RequestException as e:
             print(f"Warning: Failed to fetch metadata for dataset {dataset_id}: {e}")
             return {"status": "error", "error": str(e)}
@@ -168,19 +349,14 @@ def download_dataset(
                 print(f"Warning: No download URL returned for dataset {dataset_id}")
                 return {"status": "error", "error": "No download URL"}
 
-            # Download the actual file
-            file_resp = local_session.get(file_url, timeout=300)
-            file_resp.raise_for_status()
-
-            output_filename = f"{dataset_name}.{file_format}"
             # Sanitize filename if needed (basic)
-            output_filename = "".join(
-                c for c in output_filename if c.isalnum() or c in (" ", ".", "_", "-")
-            ).strip()
+            output_filename = get_dataset_filename(dataset_name, file_format)
             output_file = base_path / output_filename
 
-            with open(output_file, "wb") as f:
-                f.write(file_resp.content)
+            # Download the actual file
+            current_meta["sha256"] = stream_download(
+                local_session, file_url, output_file
+            )
             print(f"  Saved to: {output_file.name}")
 
         except requests.RequestException as e:
@@ -224,9 +400,9 @@ def download_collection(collection_id: str):
         # 1. Fetch Collection Metadata
         coll_url = COLLECTION_METADATA_URL.format(collection_id)
         try:
-            resp = session.get(coll_url, timeout=30)
-            resp.raise_for_status()
-            coll_data = resp.json().get("data", {})
+            coll_data = cached_get_json(session, coll_url, ttl=METADATA_TTL).get(
+                "data", {}
+            )
             coll_meta = coll_data.get("collectionMetadata", {})
         except requests.RequestException as e:
             print(f"Error fetching collection metadata: {e}")
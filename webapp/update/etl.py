@@ -3,21 +3,32 @@ from pathlib import Path
 import datetime
 import polars as pl
 
-from webapp.read import get_project_root, schema
-from webapp.update.convert import csv_to_parquet
+from webapp.read import get_project_root, get_store_months, schema
+from webapp.update.amenities import build_amenities
+from webapp.update.build import build_dataset
 from webapp.update.extract import extract, get_timestamps
+from webapp.update.httpcache import report_cache
+from webapp.update.manifest import get_dirty_months
 
 
 def update_data(subdir: str = "Resale Flat Prices"):
     """Executes ETL process"""
     csv_file_glob: Path = get_project_root() / "data" / subdir / "20*.csv"
-    df = pl.read_csv(csv_file_glob, schema=schema)
+    df = pl.scan_csv(csv_file_glob, schema=schema).select("month").collect()
 
     start, end = get_timestamps(df)
-    has_changed = extract([start, end, "-f"])
-    if has_changed:
-        csv_to_parquet(subdir)
-        print("Changes detected")
+    changed_months = extract([start, end, "-f", "--scan"])
+    report_cache()
+    dirty_months = set(changed_months)
+    if get_store_months(subdir):
+        # also rebuild partitions left behind by an earlier run that stopped early
+        dirty_months |= set(get_dirty_months(subdir))
+    dirty_months = sorted(dirty_months)
+    if dirty_months:
+        # only the partitions of the rewritten months are rebuilt
+        build_dataset(subdir, months=dirty_months)
+        build_amenities(subdir)
+        print(f"Changes detected in {', '.join(dirty_months)}")
 
         with open(get_project_root() / "data" / subdir / "metadata", "w") as f:
             f.write(f"{int(datetime.datetime.now().timestamp())}")
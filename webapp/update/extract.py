@@ -1,22 +1,54 @@
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from datetime import datetime
-from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlparse
 
-import pandas as pd
 import json
+import polars as pl
+import requests
 from dateutil.relativedelta import relativedelta
 from webapp.utils import get_project_root
 from webapp.update.property_info import update_property_info
+from webapp.update.geocache import (
+    connect,
+    lookup,
+    match_locally,
+    seed_from_property_info,
+)
 from webapp.update.geocoding import get_map_results
-from webapp.update.datagov import fetch_data_gov_sg
-from webapp.read import schema
-from numpy import nan
-
-
-@lru_cache
+from webapp.update.manifest import (
+    MANIFEST_FILE,
+    get_fingerprint,
+    is_revised,
+    load_manifest,
+    record_month,
+)
+from webapp.update.datagov import (
+    BASE_SEARCH_URL,
+    fetch_data_gov_sg,
+    probe_data_gov_sg,
+)
+from webapp.update.ratelimit import DEFAULT_CONCURRENCY, DEFAULT_RATE, configure_host
+from webapp.read import schema, to_date
+
+DATASET_ID = "d_8b84c4ee58e3cfc0ece0d773c8ca6abc"
+
+# the monthly CSVs keep full precision; the store narrows floats when it loads them
+CSV_SCHEMA = {
+    **schema,
+    "floor_area_sqm": pl.Float64,
+    "resale_price": pl.Float64,
+    "latitude": pl.Float64,
+    "longitude": pl.Float64,
+}
+
+
+# not memoised: pages are already cached on disk by webapp.update.httpcache, and
+# keeping every month's records in memory dominated the ETL's peak memory
 def extract_hdb_data(year_month):
-    dataset_id = "d_8b84c4ee58e3cfc0ece0d773c8ca6abc"
+    dataset_id = DATASET_ID
     query_params = {
         "filters": json.dumps({"month": year_month}),
         # "limit": 14000 # fetch_data_gov_sg handles pagination automatically
@@ -27,54 +59,106 @@ def extract_hdb_data(year_month):
     return records
 
 
-def get_data(start_date="2019-01", end_date=pd.Timestamp.now().strftime("%Y-%m")):
-    dates = (
-        pd.date_range(start=start_date, end=end_date, freq="MS")
-        .strftime("%Y-%m")
-        .tolist()
+def records_to_frame(records: list) -> pl.DataFrame:
+    if not records:
+        return pl.DataFrame()
+
+    df = pl.DataFrame(records, infer_schema_length=None)
+    return df.with_columns(address=pl.concat_str("block", "street_name", separator=" "))
+
+
+def get_months(start_date: str, end_date: str) -> list[str]:
+    """List the YYYY-MM months from start_date to end_date inclusive."""
+    return (
+        pl.date_range(to_date(start_date), to_date(end_date), "1mo", eager=True)
+        .dt.strftime("%Y-%m")
+        .to_list()
     )
 
+
+def get_data(start_date="2019-01", end_date=datetime.now().strftime("%Y-%m")):
     all_items = []
-    for date in dates:
+    for date in get_months(start_date, end_date):
         res = extract_hdb_data(date)
         all_items.extend(res)
 
-    df = pd.DataFrame(all_items)
-    if df.empty:
-        return pd.DataFrame()
+    return records_to_frame(all_items)
 
-    df["address"] = df["block"] + " " + df["street_name"]
-    return df.reset_index(drop=True)
 
+def seed_manifest(months: list[str], data_dir: Path):
+    """
+    Record the months that have a CSV but no manifest entry, as on the first
+    run, from the CSV itself. Their probes are then compared with what the CSV
+    holds instead of every such month counting as revised.
+    """
+    manifest_path = data_dir / MANIFEST_FILE
+    manifest = load_manifest(manifest_path)
+    for month in months:
+        existing_data = scan_existing_data(data_dir / f"{month}.csv")
+        if month in manifest or existing_data is None:
+            continue
+        df = existing_data.collect()
+        probe = {"total": len(df), "max_id": int(df["_id"].max())}
+        record_month(manifest_path, month, get_fingerprint(df), len(df), **probe)
 
-def load_existing_data(file_path: Path) -> pd.DataFrame:
-    """Load existing data from a CSV file if it exists, otherwise return an empty DataFrame."""
-    if file_path.exists():
-        df = pd.read_csv(
-            file_path,
-            dtype={
-                "_id": "Int64",
-                "month": str,
-                "town": str,
-                "flat_type": str,
-                "block": str,
-                "street_name": str,
-                "storey_range": str,
-                "floor_area_sqm": float,
-                "flat_model": str,
-                "lease_commence_date": "Int64",
-                "remaining_lease": str,
-                "resale_price": float,
-                "address": str,
-                "postal": "Int64",
-                "latitude": float,
-                "longitude": float,
-            },
-        )
 
-        return df
+def find_revised_months(
+    months: list[str], data_dir: Path, workers: int = DEFAULT_CONCURRENCY
+) -> list[str]:
+    """
+    Probe each month's record total and max _id in parallel and return the
+    months that differ from the manifest, i.e. the ones worth re-fetching.
+    A month whose probe fails is taken as unchanged and probed again next run.
+    """
+    seed_manifest(months, data_dir)
+    manifest = load_manifest(data_dir / MANIFEST_FILE)
+
+    def probe(month):
+        query_params = {"filters": json.dumps({"month": month})}
+        try:
+            return probe_data_gov_sg(DATASET_ID, query_params)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Probe of {month} failed ({e}), taken as unchanged")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        probes = dict(zip(months, pool.map(probe, months)))
+
+    failed = [month for month, result in probes.items() if result is None]
+    revised = [
+        month
+        for month, result in probes.items()
+        if result and result["total"] and is_revised(manifest.get(month), result)
+    ]
+    print(
+        f"Probed {len(months)} months, {len(failed)} failed, "
+        f"{len(revised)} revised: {', '.join(revised)}"
+    )
+    return revised
+
+
+def fetch_months(months: list[str], workers: int = DEFAULT_CONCURRENCY):
+    """
+    Fetch several months at once on a thread pool and yield (month, DataFrame)
+    in completion order. Requests still go through the per-host limits in
+    webapp.update.ratelimit, so workers only bounds the months in progress.
+    """
+
+    def fetch(month):
+        return records_to_frame(extract_hdb_data(month))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, month): month for month in months}
+        for future in as_completed(futures):
+            # drop the reference so a processed month can be freed
+            yield futures.pop(future), future.result()
+
 
-    return pd.DataFrame()
+def scan_existing_data(file_path: Path) -> pl.LazyFrame | None:
+    """Scan the month's CSV if it exists; nothing is read until the frame is collected."""
+    if file_path.exists():
+        return pl.scan_csv(file_path, schema_overrides=CSV_SCHEMA)
+    return None
 
 
 def skip_process(file_path: Path, should_process: bool) -> bool:
@@ -85,11 +169,15 @@ def skip_process(file_path: Path, should_process: bool) -> bool:
     return True
 
 
-def get_coordinate_map(new_data: pd.DataFrame, force=False) -> pd.DataFrame:
+def get_coordinate_map(new_data: pl.DataFrame, force=False) -> pl.DataFrame:
     """
-    Retrieve coordinate map (address -> lat, lon, postal).
-    Updates property_info if addresses are missing.
-    Falls back to manual fetching for stubborn missing addresses.
+    Retrieve coordinate map (address -> lat, lon, postal) for new_data.
+
+    Addresses are looked up in the SQLite geocoding cache, which holds the
+    property info coordinates plus every earlier geocoder result. Property info
+    is refreshed only for addresses that neither the cache nor the offline
+    matcher can place; whatever is still missing goes to the geocoder, which
+    skips addresses that failed recently.
     """
     property_info_path = (
         get_project_root()
@@ -97,122 +185,119 @@ def get_coordinate_map(new_data: pd.DataFrame, force=False) -> pd.DataFrame:
         / "HDB Property Information"
         / "HDB Property Information.CSV"
     )
-    coord_cols = ["address", "postal", "latitude", "longitude"]
+    addresses = new_data["address"].drop_nulls().unique(maintain_order=True).to_list()
 
-    # 1. Load existing property info
-    if property_info_path.exists():
-        property_info = pd.read_csv(property_info_path)
-    else:
-        property_info = pd.DataFrame()
+    # 1. Look up the cache, loading property info if it changed since last run
+    with closing(connect()) as con:
+        seed_from_property_info(con, property_info_path)
+        found, pending = lookup(con, addresses)
 
-    # 2. Check for missing addresses
-    known_addresses = set(property_info["address"]) if not property_info.empty else set()
-    missing_mask = ~new_data["address"].isin(known_addresses)
+        # 2. Match spelling variants of known addresses offline
+        if pending:
+            matched, unmatched = match_locally(con, pending)
+            print(
+                f"Matched {len(matched)} of {len(pending)} unknown addresses locally "
+                f"({len(matched) / len(pending):.0%}); avoided {len(matched)} "
+                f"geocoding calls{'' if unmatched else ' and a property info refresh'}"
+            )
+            found = pl.concat([found, matched])
+            pending = unmatched
+
+        if pending:
+            print(
+                f"Found {len(pending)} addresses not in the geocoding cache. Updating property info..."
+            )
+            # 3. Update property info ONCE, then look again
+            update_property_info(property_info_path, force=force)
+            seed_from_property_info(con, property_info_path)
+            found, pending = lookup(con, addresses)
 
-    if missing_mask.any():
+    # 4. Fallback: geocode the addresses that are still unknown
+    if pending:
         print(
-            f"Found {missing_mask.sum()} addresses not in property info. Updating property info..."
+            f"Still {len(pending)} addresses missing after update. Fetching manually..."
         )
-        # Update property info ONCE
-        property_info = update_property_info(property_info_path, force=force)
+        fresh_map_data = get_map_results(pl.DataFrame({"address": pending}))
+        # fresh results replace matched coordinates that were due for a recheck
+        found = pl.concat([fresh_map_data.drop_nulls("latitude"), found])
 
-        # Refresh known addresses
-        if not property_info.empty:
-            known_addresses = set(property_info["address"])
-        else:
-            known_addresses = set()
+    return found.unique(subset="address", keep="first", maintain_order=True)
 
-        still_missing_mask = ~new_data["address"].isin(known_addresses)
 
-        # 3. Fallback: Manual Fetch for still missing addresses
-        if still_missing_mask.any():
-            print(
-                f"Still {still_missing_mask.sum()} addresses missing after update. Fetching manually..."
-            )
-            missing_addresses_df = new_data.loc[
-                still_missing_mask, ["address"]
-            ].drop_duplicates()
-            fresh_map_data = get_map_results(missing_addresses_df)
-
-            if not fresh_map_data.empty:
-                # Append fresh results to property_info for this session only (to be returned)
-                fresh_coords = (
-                    fresh_map_data[coord_cols]
-                    if set(coord_cols).issubset(fresh_map_data.columns)
-                    else fresh_map_data
-                )
-                property_info = pd.concat(
-                    [property_info, fresh_coords], ignore_index=True
-                )
-
-                # Save the updated property info with manually fetched addresses
-                # Deduplicate by address to keep the file clean
-                property_info = property_info.drop_duplicates(
-                    subset=["address"], keep="last"
-                )
-                property_info.to_csv(property_info_path, index=False)
-                print(
-                    f"Saved updated property info with {len(fresh_coords)} new addresses to {property_info_path}"
-                )
-
-    # 4. Return unique coordinate map
-    if not property_info.empty:
-        # Ensure we have the columns we need
-        available_cols = [c for c in coord_cols if c in property_info.columns]
-        return property_info[available_cols].drop_duplicates(subset=["address"])
-
-    return pd.DataFrame(columns=coord_cols)
-
-
-def process_month(month: str, data_dir: Path, should_process: bool = False):
-    """Process and save data for a given month."""
+def process_month(
+    month: str,
+    data_dir: Path,
+    should_process: bool = False,
+    new_data: pl.DataFrame = None,
+):
+    """Process and save data for a given month, downloading it unless new_data is given."""
     file_path = data_dir / f"{month}.csv"
 
     if not skip_process(file_path, should_process):
         return False
 
     # 1. Download new data for the month
-    new_data = get_data(start_date=month, end_date=month)
-    if new_data.empty:
+    if new_data is None:
+        new_data = get_data(start_date=month, end_date=month)
+    if new_data.is_empty():
         print(f"No data found for {month}")
         return False
 
-    existing_data = load_existing_data(file_path)
-    if not existing_data.empty and len(new_data) == len(existing_data):
-        print(f"{month}: Same data size, skip...")
-        return
+    # compare content fingerprints; the CSV is only read when the manifest
+    # has no entry for the month yet
+    manifest_path = data_dir / MANIFEST_FILE
+    fingerprint = get_fingerprint(new_data)
+    # what a probe of the datastore returns for this month, see find_revised_months
+    probe = {
+        "total": len(new_data),
+        "max_id": int(new_data["_id"].cast(pl.Int64).max()),
+    }
+    known = load_manifest(manifest_path).get(month, {}).get("fingerprint")
+    existing_data = scan_existing_data(file_path)
+    if known is None and existing_data is not None:
+        known = get_fingerprint(existing_data.collect())
+    if existing_data is not None and known == fingerprint:
+        print(f"{month}: Unchanged, skip...")
+        rows = existing_data.select(pl.len()).collect().item()
+        record_month(manifest_path, month, fingerprint, rows, **probe)
+        return False
 
     # 2. Get Geocoding Info
-    property_coords = get_coordinate_map(new_data)
+    property_coords = get_coordinate_map(new_data).with_columns(
+        pl.col("postal").str.to_integer(strict=False)
+    )
 
     # 3. Merge Coordinates
     # Remove existing coord cols from new_data if present to avoid overlap
-    new_data = new_data.drop(
-        columns=[c for c in ["postal", "latitude", "longitude"] if c in new_data.columns]
+    merged = (
+        new_data.lazy()
+        .drop(["postal", "latitude", "longitude"], strict=False)
+        .with_columns(pl.col("_id").cast(pl.Int64))
+        .join(property_coords.lazy(), on="address", how="left")
     )
-    merged_df = new_data.merge(property_coords, on="address", how="left")
-
-    # 4. Combine with existing data and deduplicate
-    if not existing_data.empty:
-        ts_map = existing_data.set_index("_id")["_ts"]
-        merged_df["_ts"] = merged_df["_id"].map(ts_map)
 
-    df = merged_df
-    print(f"Total number of observations for {month}: {df.shape[0]}")
+    # 4. Keep the first-seen timestamp of rows already in the CSV
+    if existing_data is not None:
+        timestamps = existing_data.select("_id", "_ts").unique(
+            subset="_id", keep="first"
+        )
+        merged = merged.join(timestamps, on="_id", how="left")
+    else:
+        merged = merged.with_columns(_ts=pl.lit(None, dtype=pl.Utf8))
 
-    # 5. Add/Fill Timestamp
+    # 5. Fill new rows' timestamp and enforce the schema in one pass
     today = datetime.today().strftime("%Y-%m-%d")
-    df["_ts"] = df.get("_ts", nan)
-    df["_ts"] = df["_ts"].fillna(today)
-
-    for col, dtype in schema.items():
-        if col in df.columns:
-            try:
-                df[col] = df[col].astype(dtype)
-            except Exception:
-                pass
+    columns = merged.collect_schema().names()
+    df = (
+        merged.with_columns(pl.col("_ts").fill_null(today))
+        .select([col for col in CSV_SCHEMA if col in columns])
+        .cast({col: dtype for col, dtype in CSV_SCHEMA.items() if col in columns})
+        .collect()
+    )
+    print(f"Total number of observations for {month}: {df.shape[0]}")
 
-    df.to_csv(file_path, index=False)
+    df.write_csv(file_path)
+    record_month(manifest_path, month, fingerprint, len(df), **probe)
     return True
 
 
@@ -228,29 +313,60 @@ def get_timestamps(df=None) -> tuple[str, str]:
     return last_month, current_month
 
 
-def extract(raw_args=None, subdir: str = "Resale Flat Prices"):
+def extract(raw_args=None, subdir: str = "Resale Flat Prices") -> list[str]:
+    """Fetch the requested months and return the months whose CSV was rewritten."""
     parser = ArgumentParser(description="Fetch HDB and map data.")
     parser.add_argument("start_date", type=str, help="Start date in YYYY-MM format")
     parser.add_argument("end_date", type=str, help="End date in YYYY-MM format")
     parser.add_argument("-f", "--force", action="store_true")
+    parser.add_argument(
+        "--scan",
+        action="store_true",
+        help="Probe every month with a CSV and re-fetch the ones revised upstream",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Requests in flight to the datastore host at once",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="Requests per second to the datastore host",
+    )
     args = parser.parse_args(raw_args)
 
     data_dir = Path("data") / subdir
     data_dir.mkdir(exist_ok=True)
 
-    start_date = pd.to_datetime(args.start_date, format="%Y-%m")
-    end_date = pd.to_datetime(args.end_date, format="%Y-%m")
-    months = (
-        pd.date_range(start=start_date, end=end_date, freq="MS")
-        .strftime("%Y-%m")
-        .tolist()
-    )
+    months = get_months(args.start_date, args.end_date)
     last_month, current_month = get_timestamps()
 
-    all_changed = False
-    for month in months:
-        should_process = args.force or month in (last_month, current_month)
-        month_changed = process_month(month, data_dir, should_process)
+    configure_host(urlparse(BASE_SEARCH_URL).netloc, args.concurrency, args.rate)
+
+    revised_months = []
+    if args.scan:
+        history = sorted(path.stem for path in data_dir.glob("20*.csv"))
+        revised_months = find_revised_months(history, data_dir, args.concurrency)
+        months = sorted(set(months) | set(revised_months))
+
+    # only download the months that will be processed
+    months = [
+        month
+        for month in months
+        if skip_process(
+            data_dir / f"{month}.csv",
+            args.force or month in (last_month, current_month, *revised_months),
+        )
+    ]
+
+    # geocoding and the property info file are not thread-safe, so months are
+    # processed one at a time here as their downloads complete
+    changed_months = []
+    for month, new_data in fetch_months(months, workers=args.concurrency):
+        month_changed = process_month(month, data_dir, True, new_data=new_data)
         if month_changed:
-            all_changed = True
-    return all_changed
+            changed_months.append(month)
+    return sorted(changed_months)
@@ -0,0 +1,211 @@
+import math
+import sqlite3
+import time
+from pathlib import Path
+
+import polars as pl
+
+from webapp.update.address import build_address_index, match_address
+from webapp.utils import get_project_root
+
+GEOCODE_DB = get_project_root() / "data" / "HDB Property Information" / "geocode.sqlite"
+
+# an address that failed is retried after NEGATIVE_RETRY seconds, doubling with
+# every further failure up to NEGATIVE_RETRY_MAX
+NEGATIVE_RETRY = 7 * 24 * 60 * 60
+NEGATIVE_RETRY_MAX = 90 * 24 * 60 * 60
+
+# an address placed by the offline matcher is sent to the geocoder after this
+# many seconds, in case it was matched to the wrong block
+MATCHED_RECHECK = 90 * 24 * 60 * 60
+
+COORD_SCHEMA = {
+    "address": pl.Utf8,
+    "postal": pl.Utf8,
+    "latitude": pl.Float64,
+    "longitude": pl.Float64,
+}
+COORD_COLUMNS = list(COORD_SCHEMA)
+
+
+def connect(path: Path = GEOCODE_DB) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS geocode (
+            address TEXT PRIMARY KEY,
+            postal TEXT,
+            latitude REAL,
+            longitude REAL,
+            source TEXT NOT NULL,
+            looked_up_at REAL NOT NULL,
+            failures INTEGER NOT NULL DEFAULT 0,
+            retry_after REAL
+        )
+        """)
+    con.execute("CREATE TABLE IF NOT EXISTS seeds (path TEXT PRIMARY KEY, mtime REAL)")
+    return con
+
+
+def seed_from_property_info(con: sqlite3.Connection, path: Path):
+    """
+    Load the coordinates in the property info CSV as source "property_info".
+    The CSV is only read again after it changes on disk.
+    """
+    if not path.exists():
+        return
+    mtime = path.stat().st_mtime
+    row = con.execute("SELECT mtime FROM seeds WHERE path = ?", (str(path),)).fetchone()
+    if row and row[0] >= mtime:
+        return
+
+    columns = pl.read_csv(path, n_rows=0).columns
+    if set(COORD_COLUMNS) - set(columns):
+        return
+    df = (
+        pl.scan_csv(path, schema_overrides=COORD_SCHEMA, null_values=["nan"])
+        .select(COORD_COLUMNS)
+        .drop_nulls(["address", "latitude", "longitude"])
+        .unique(subset="address", keep="last", maintain_order=True)
+        .collect()
+    )
+    save_found(con, df.to_dicts(), "property_info")
+    con.execute(
+        "INSERT OR REPLACE INTO seeds (path, mtime) VALUES (?, ?)", (str(path), mtime)
+    )
+    con.commit()
+
+
+def format_postal(value) -> str | None:
+    """Postal codes read back from CSV can be floats; store them as 6-digit text."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        value = int(value)
+    return str(value).zfill(6)
+
+
+def save_found(
+    con: sqlite3.Connection,
+    records: list[dict],
+    source: str,
+    recheck_after: float = None,
+):
+    """
+    Store geocoded addresses; this clears any earlier failure for them. With
+    recheck_after (seconds), lookup sends them to the geocoder again after that.
+    """
+    now = time.time()
+    retry_after = now + recheck_after if recheck_after is not None else None
+    con.executemany(
+        """
+        INSERT OR REPLACE INTO geocode
+            (address, postal, latitude, longitude, source, looked_up_at, failures,
+             retry_after)
+        VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+        """,
+        [
+            (
+                r["address"],
+                format_postal(r["postal"]),
+                float(r["latitude"]),
+                float(r["longitude"]),
+                r.get("source", source),
+                now,
+                retry_after,
+            )
+            for r in records
+        ],
+    )
+    con.commit()
+
+
+def save_failed(con: sqlite3.Connection, addresses: list[str], source: str):
+    """Record addresses no provider could place, and when to try them again."""
+    now = time.time()
+    for address in addresses:
+        row = con.execute(
+            "SELECT failures, latitude FROM geocode WHERE address = ?", (address,)
+        ).fetchone()
+        if row and row[1] is not None:
+            # never replace a known location with a failure
+            continue
+        failures = (row[0] if row else 0) + 1
+        retry_after = now + min(
+            NEGATIVE_RETRY * 2 ** (failures - 1), NEGATIVE_RETRY_MAX
+        )
+        con.execute(
+            """
+            INSERT OR REPLACE INTO geocode
+                (address, source, looked_up_at, failures, retry_after)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (address, source, now, failures, retry_after),
+        )
+    con.commit()
+
+
+def lookup(con: sqlite3.Connection, addresses: list[str]) -> tuple[pl.DataFrame, list]:
+    """
+    Return (found, pending) for the given addresses.
+
+    found holds the known coordinates. pending lists the addresses to send to
+    a geocoder: never looked up, or past their retry_after after failing or
+    being matched offline. A matched address stays in found until then.
+    """
+    now = time.time()
+    addresses = list(dict.fromkeys(addresses))
+    rows = []
+    # stay under SQLite's bound-parameter limit
+    for i in range(0, len(addresses), 500):
+        chunk = addresses[i : i + 500]
+        rows += con.execute(
+            f"""
+            SELECT address, postal, latitude, longitude, retry_after
+            FROM geocode WHERE address IN ({",".join("?" * len(chunk))})
+            """,
+            chunk,
+        ).fetchall()
+
+    known = {row[0]: row for row in rows}
+    found = [row[:4] for row in rows if row[2] is not None]
+    pending = [
+        address
+        for address in addresses
+        if address not in known
+        or (known[address][4] is not None and known[address][4] <= now)
+    ]
+    return pl.DataFrame(found, schema=COORD_SCHEMA, orient="row"), pending
+
+
+def match_locally(
+    con: sqlite3.Connection, addresses: list[str]
+) -> tuple[pl.DataFrame, list]:
+    """
+    Resolve addresses against the geocoded ones with the offline matcher in
+    webapp.update.address. Returns (matched, unmatched); matched rows carry the
+    coordinates of the address they matched and are cached as source "matched"
+    until MATCHED_RECHECK. Addresses matched before, now due for that recheck,
+    are left unmatched for the geocoder.
+    """
+    rows = con.execute(
+        "SELECT address, postal, latitude, longitude, source FROM geocode "
+        "WHERE latitude IS NOT NULL"
+    ).fetchall()
+    coords = {row[0]: row[:4] for row in rows if row[4] != "matched"}
+    rechecks = {row[0] for row in rows if row[4] == "matched"}
+    index = build_address_index(list(coords))
+
+    matched, unmatched = [], []
+    for address in addresses:
+        known = None if address in rechecks else match_address(index, address)
+        if known is None:
+            unmatched.append(address)
+        else:
+            matched.append((address, *coords[known][1:]))
+
+    matched = pl.DataFrame(matched, schema=COORD_SCHEMA, orient="row")
+    save_found(con, matched.to_dicts(), "matched", recheck_after=MATCHED_RECHECK)
+    return matched, unmatched
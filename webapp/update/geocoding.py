@@ -1,13 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from urllib.parse import urlparse
+
+import polars as pl
 import requests
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+from webapp.update.geocache import (
+    connect,
+    lookup,
+    save_failed,
+    save_found,
+)
+from webapp.update.ratelimit import configure_host, limited
 
-def fetch_osm_postal(query_address, session: requests.Session):
-    query_string = f"https://nominatim.openstreetmap.org/search?q={query_address}&format=json&addressdetails=1"
+ONEMAP_SEARCH_URL = "https://www.onemap.gov.sg/api/common/elastic/search"
+NOMINATIM_SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+
+# requests in flight and requests per second for each provider; Nominatim's
+# usage policy allows one request per second
+PROVIDER_LIMITS = {
+    ONEMAP_SEARCH_URL: (4, 4.0),
+    NOMINATIM_SEARCH_URL: (1, 1.0),
+}
+GEOCODE_WORKERS = 4
+GEOCODE_RETRIES = 4
+GEOCODE_TIMEOUT = (5, 15)  # connect, read
+
+# statuses worth retrying; anything else is an answer or a hard failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def configure_providers():
+    for url, (concurrency, rate) in PROVIDER_LIMITS.items():
+        configure_host(urlparse(url).netloc, concurrency, rate)
+
+
+# once per process: configuring again would reset the limits of requests
+# in flight, so concurrent geocode() calls could exceed them
+configure_providers()
+
+
+def record(provider: str, latency: float, retries: int, failed: bool):
+    with _stats_lock:
+        stats = _stats.setdefault(
+            provider,
+            {"requests": 0, "retries": 0, "failures": 0, "latency": 0.0, "max": 0.0},
+        )
+        stats["requests"] += 1
+        stats["retries"] += retries
+        stats["failures"] += failed
+        stats["latency"] += latency
+        stats["max"] = max(stats["max"], latency)
+
+
+def get_geocoder_stats() -> dict:
+    """Requests, retries, failures and mean/max latency (s) per provider."""
+    with _stats_lock:
+        return {
+            provider: {
+                **stats,
+                "latency": stats["latency"] / max(stats["requests"], 1),
+            }
+            for provider, stats in _stats.items()
+        }
+
+
+def provider_get(session: requests.Session, url: str, params: dict):
+    """
+    GET a provider's JSON under its rate limit, with a timeout and retries with
+    exponential backoff on errors and throttling. Raises after GEOCODE_RETRIES.
+    """
+    provider = urlparse(url).netloc
+    start = time.monotonic()
+    for attempt in range(GEOCODE_RETRIES):
+        try:
+            with limited(url):
+                resp = session.get(url, params=params, timeout=GEOCODE_TIMEOUT)
+            if resp.status_code not in RETRY_STATUSES:
+                resp.raise_for_status()
+                result = resp.json()
+                record(provider, time.monotonic() - start, attempt, False)
+                return result
+            error = requests.HTTPError(f"{resp.status_code} from {provider}")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        if attempt < GEOCODE_RETRIES - 1:
+            time.sleep(0.5 * 2**attempt)
 
-    response = session.get(query_string).json()
+    record(provider, time.monotonic() - start, GEOCODE_RETRIES - 1, True)
+    raise error
+
+
+def fetch_osm_postal(query_address, session: requests.Session):
+    response = provider_get(
+        session,
+        NOMINATIM_SEARCH_URL,
+        {"q": query_address, "format": "json", "addressdetails": 1},
+    )
 
     if not response:
         return None
@@ -16,24 +111,30 @@ def fetch_osm_postal(query_address, session: requests.Session):
 
 
 def fetch_map_data(query_address, session: requests.Session):
-    query_string = (
-        "https://www.onemap.gov.sg/api/common/elastic/search?&searchVal="
-        + query_address
-        + "&returnGeom=Y&getAddrDetails=Y"
-    )
-
-    response = session.get(query_string).json()["results"]
+    response = provider_get(
+        session,
+        ONEMAP_SEARCH_URL,
+        {"searchVal": query_address, "returnGeom": "Y", "getAddrDetails": "Y"},
+    )["results"]
 
     if len(response):
+        response = response[0]
         postal_code = response["POSTAL"]
+        source = "onemap"
         # use open street map if postal code is null or invalid
         if len(str(postal_code)) < 6:
-            postal_code = fetch_osm_postal(query_address, session)
+            try:
+                postal_code = fetch_osm_postal(query_address, session)
+                source = "onemap+nominatim"
+            except requests.RequestException as e:
+                # keep the OneMap location without a postal code
+                print(f"Nominatim failed for {query_address}: {e}")
         return {
             "address": query_address,
             "postal": postal_code,
             "latitude": response["LATITUDE"],
             "longitude": response["LONGITUDE"],
+            "source": source,
         }
 
     else:
@@ -42,26 +143,80 @@ def fetch_map_data(query_address, session: requests.Session):
             "postal": None,
             "latitude": None,
             "longitude": None,
+            "source": "onemap",
+        }
+
+
+def geocode(addresses: list[str], session: requests.Session) -> tuple[list, list]:
+    """
+    Geocode addresses on GEOCODE_WORKERS threads under the provider limits.
+
+    Returns (results, errors): one result per address that got an answer, found
+    or not, and the addresses whose requests kept failing. A failing address
+    does not stop the others.
+    """
+    results, errors = [], []
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_map_data, address, session): address
+            for address in addresses
         }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            try:
+                results.append(future.result())
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Geocoding failed for {futures[future]}: {e}")
+                errors.append(futures[future])
+
+    elapsed = time.monotonic() - start
+    print(
+        f"Geocoded {len(results)} addresses in {elapsed:.1f}s "
+        f"({len(results) / max(elapsed, 1e-9):.1f}/s), {len(errors)} failed"
+    )
+    for provider, stats in get_geocoder_stats().items():
+        print(
+            f"  {provider}: {stats['requests']} lookups, {stats['retries']} retries, "
+            f"{stats['failures']} failed, mean {stats['latency'] * 1000:.0f} ms, "
+            f"max {stats['max'] * 1000:.0f} ms"
+        )
+    return results, errors
 
 
-def get_map_results(data):
+def get_map_results(data: pl.DataFrame) -> pl.DataFrame:
+    """
+    Geocode the addresses in data["address"], going through the SQLite cache.
+
+    Known addresses are answered from the cache, and addresses that failed
+    recently are skipped until their retry_after; only the rest are queried.
+    Returns one row per address, with null coordinates where none are known.
+    """
     headers = {
         "User-Agent": "HDB Kaki/1.0 (https://hdb-kaki.streamlit.app/)",
         "Referer": "https://hdb-kaki.streamlit.app/",
     }
 
-    unique_address = list(dict.fromkeys(data["address"]))
-    with requests.Session() as session:
-        session.headers = headers
-        with ThreadPoolExecutor() as executor:
-            results = list(
-                tqdm(
-                    executor.map(
-                        lambda addr: fetch_map_data(addr, session), unique_address
-                    ),
-                    total=len(unique_address),
-                )
+    unique_address = data["address"].unique(maintain_order=True).to_list()
+    with closing(connect()) as con:
+        found, pending = lookup(con, unique_address)
+        print(
+            f"Geocoding: {len(found)} cached, {len(pending)} to query, "
+            f"{len(unique_address) - len(found) - len(pending)} recently failed"
+        )
+
+        if pending:
+            with requests.Session() as session:
+                session.headers = headers
+                results, _ = geocode(pending, session)
+
+            # addresses whose requests failed are left out and tried next run
+            save_found(con, [r for r in results if r["latitude"] is not None], "onemap")
+            save_failed(
+                con, [r["address"] for r in results if r["latitude"] is None], "onemap"
             )
+            # read the new results back, typed and formatted like the cached ones
+            found, _ = lookup(con, unique_address)
 
-    return pd.DataFrame(results)
+    return pl.DataFrame({"address": unique_address}, schema={"address": pl.Utf8}).join(
+        found, on="address", how="left"
+    )
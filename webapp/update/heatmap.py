@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import polars as pl
+
+from webapp.heatmap import (
+    GRID_FILE,
+    GRID_KEYS,
+    GRID_SIZES,
+    GRID_SPANS,
+    STREETS_FILE,
+    get_merge_exprs,
+    summarize_grid,
+    summarize_streets,
+)
+from webapp.read import scan_dataframe
+from webapp.utils import get_project_root
+
+
+def write_atomically(frame: pl.DataFrame, file_path: Path):
+    """Swap in a complete file; the app may be reading the previous one."""
+    tmp_path = file_path.with_suffix(".tmp")
+    frame.write_parquet(tmp_path)
+    tmp_path.replace(file_path)
+
+
+def build_heatmap_grid(subdir: str = "Resale Flat Prices"):
+    """
+    Materialise the heatmap pyramid read by the Heatmap page: partial
+    aggregates per flat type and grid cell at each of GRID_SIZES, for every
+    month and, merged from those, every calendar year. The street of each
+    cell is kept once, in a table of its own.
+    """
+    lf = scan_dataframe(subdir=subdir)
+    levels, streets = [], []
+    for grid_size in GRID_SIZES:
+        streets.append(
+            summarize_streets(lf, grid_size)
+            .sort("lat_bin", "lon_bin")
+            .select(pl.lit(grid_size, pl.UInt16).alias("grid_size"), pl.all())
+        )
+        months = summarize_grid(lf, grid_size)
+        for span in GRID_SPANS:
+            cells = months
+            if span > 1:
+                cells = months.group_by(
+                    pl.col("month").dt.truncate(f"{span}mo"),
+                    *GRID_KEYS[1:],
+                ).agg(get_merge_exprs())
+            levels.append(
+                cells.sort(GRID_KEYS).select(
+                    pl.lit(grid_size, pl.UInt16).alias("grid_size"),
+                    pl.lit(span, pl.UInt8).alias("span_months"),
+                    pl.all(),
+                )
+            )
+    frames = pl.collect_all(levels + streets)
+    grid = pl.concat(frames[: len(levels)])
+    street_table = pl.concat(frames[len(levels) :])
+
+    data_dir = get_project_root() / "data" / subdir
+    write_atomically(grid, data_dir / GRID_FILE)
+    write_atomically(street_table, data_dir / STREETS_FILE)
+    print(
+        f"Wrote {grid.height} heatmap grid rows and {street_table.height} cell "
+        f"streets to {data_dir}"
+    )
+
+
+if __name__ == "__main__":
+    build_heatmap_grid()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import time
+
+import requests
+
+from webapp.update.ratelimit import limited
+from webapp.utils import get_project_root
+
+# kept out of git, and restored between workflow runs by actions/cache
+CACHE_DIR = get_project_root() / "data" / ".http_cache"
+CACHE_TTL = 12 * 60 * 60  # seconds a response is used without asking the server
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_stats = {
+    "fresh": 0,
+    "revalidated": 0,
+    "fetched": 0,
+    "bytes_saved": 0,
+    "bytes_fetched": 0,
+}
+_lock = threading.Lock()
+
+
+def get_cache_key(url: str, params: dict = None) -> str:
+    key = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def count(event: str, size: int):
+    with _lock:
+        _stats[event] += 1
+        _stats["bytes_fetched" if event == "fetched" else "bytes_saved"] += size
+
+
+def store(key: str, url: str, resp: requests.Response):
+    """Write the body, then its validators, each through a temp file and rename."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    body_file = CACHE_DIR / f"{key}.body"
+    meta_file = CACHE_DIR / f"{key}.json"
+    meta = {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+        "size": len(resp.content),
+    }
+    for path, data in (
+        (body_file, resp.content),
+        (meta_file, json.dumps(meta).encode()),
+    ):
+        tmp_path = path.with_name(path.name + f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES):
+    """Delete the least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for meta_file in CACHE_DIR.glob("*.json"):
+        body_file = meta_file.with_suffix(".body")
+        if body_file.exists():
+            stat = body_file.stat()
+            entries.append((stat.st_mtime, stat.st_size, meta_file, body_file))
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, meta_file, body_file in sorted(entries):
+        if total <= max_bytes:
+            break
+        meta_file.unlink(missing_ok=True)
+        body_file.unlink(missing_ok=True)
+        total -= size
+
+
+def cached_get(
+    session: requests.Session,
+    url: str,
+    params: dict = None,
+    ttl: float = CACHE_TTL,
+    timeout=30,
+) -> bytes:
+    """
+    GET url through the on-disk cache and return the response body.
+
+    A response younger than ttl is returned without a request. An older one is
+    revalidated with If-None-Match / If-Modified-Since when the server sent an
+    ETag or Last-Modified, and reused on 304. Otherwise the body is fetched and
+    stored. Network requests go through the per-host limits.
+    """
+    key = get_cache_key(url, params)
+    meta_file = CACHE_DIR / f"{key}.json"
+    body_file = CACHE_DIR / f"{key}.body"
+
+    meta = None
+    if meta_file.exists() and body_file.exists():
+        try:
+            meta = json.loads(meta_file.read_text())
+        except ValueError:
+            meta = None
+
+    if meta and time.time() - meta["fetched_at"] < ttl:
+        body = body_file.read_bytes()
+        body_file.touch()
+        count("fresh", len(body))
+        return body
+
+    headers = {}
+    if meta and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with limited(url):
+        resp = session.get(url, params=params, headers=headers, timeout=timeout)
+
+    if resp.status_code == 304 and meta:
+        body = body_file.read_bytes()
+        meta["fetched_at"] = time.time()
+        meta_file.write_text(json.dumps(meta))
+        body_file.touch()
+        count("revalidated", len(body))
+        return body
+
+    resp.raise_for_status()
+    store(key, url, resp)
+    count("fetched", len(resp.content))
+    return resp.content
+
+
+def cached_get_json(session: requests.Session, url: str, params: dict = None, **kwargs):
+    return json.loads(cached_get(session, url, params, **kwargs))
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def report_cache():
+    """Print how much the cache saved this run and trim it to its size budget."""
+    stats = get_cache_stats()
+    if CACHE_DIR.exists():
+        evict()
+    print(
+        f"HTTP cache: {stats['fresh']} fresh, {stats['revalidated']} revalidated, "
+        f"{stats['fetched']} fetched; "
+        f"{stats['bytes_saved'] / 1e6:.1f} MB saved, "
+        f"{stats['bytes_fetched'] / 1e6:.1f} MB downloaded"
+    )
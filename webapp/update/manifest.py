@@ -0,0 +1,122 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from webapp.read import get_store_dir
+from webapp.utils import get_project_root
+
+MANIFEST_FILE = "manifest.json"
+
+# the columns published by data.gov.sg; _id is left out because the datastore
+# renumbers rows when it reloads, and address/coordinates/_ts are added here
+SOURCE_COLUMNS = [
+    "month",
+    "town",
+    "flat_type",
+    "block",
+    "street_name",
+    "storey_range",
+    "floor_area_sqm",
+    "flat_model",
+    "lease_commence_date",
+    "remaining_lease",
+    "resale_price",
+]
+NUMERIC_COLUMNS = ["floor_area_sqm", "lease_commence_date", "resale_price"]
+
+
+def get_fingerprint(df: pl.DataFrame) -> str:
+    """
+    Hash the source columns of a month, independent of row order and of whether
+    numbers came back from the API as text or from the CSV as floats.
+
+    The rows are sorted and written as CSV before hashing rather than hashed
+    with hash_rows, whose values may change between polars versions.
+    """
+    frame = df.select(
+        (
+            pl.col(col).cast(pl.Utf8).cast(pl.Float64, strict=False)
+            if col in NUMERIC_COLUMNS
+            else pl.col(col).cast(pl.Utf8).str.strip_chars()
+        )
+        for col in SOURCE_COLUMNS
+    )
+    rows = frame.sort(SOURCE_COLUMNS, nulls_last=True).write_csv()
+    return hashlib.sha256(rows.encode()).hexdigest()
+
+
+def load_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_manifest(path: Path, manifest: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(dict(sorted(manifest.items())), file, indent=2)
+    tmp_path.replace(path)
+
+
+def get_manifest_path(subdir: str = "Resale Flat Prices") -> Path:
+    """Fingerprints of the monthly CSVs, written by extract."""
+    return get_project_root() / "data" / subdir / MANIFEST_FILE
+
+
+def get_store_manifest_path(subdir: str = "Resale Flat Prices") -> Path:
+    """Fingerprints of the CSVs each store partition was last built from."""
+    return get_store_dir(subdir) / MANIFEST_FILE
+
+
+def record_month(
+    manifest_path: Path, month: str, fingerprint: str, rows: int, **fields
+):
+    """
+    Store a month's fingerprint and row count, plus any extra fields such as
+    the datastore total and max _id. updated_at moves only when the content did.
+    """
+    manifest = load_manifest(manifest_path)
+    entry = manifest.get(month, {})
+    if entry.get("fingerprint") != fingerprint:
+        entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    entry.update(fingerprint=fingerprint, rows=rows, **fields)
+    manifest[month] = entry
+    save_manifest(manifest_path, manifest)
+
+
+def is_revised(entry: dict, probe: dict) -> bool:
+    """
+    Compare a datastore probe with a manifest entry. Entries written before
+    probes were recorded only have a row count to compare.
+    """
+    if not entry:
+        return True
+    if probe["total"] != entry.get("total", entry["rows"]):
+        return True
+    return "max_id" in entry and probe["max_id"] != entry["max_id"]
+
+
+def get_dirty_months(subdir: str = "Resale Flat Prices") -> list[str]:
+    """Months whose CSV fingerprint differs from the one their partition was built from."""
+    manifest = load_manifest(get_manifest_path(subdir))
+    converted = load_manifest(get_store_manifest_path(subdir))
+    return sorted(
+        month
+        for month, entry in manifest.items()
+        if converted.get(month) != entry["fingerprint"]
+    )
+
+
+def mark_converted(months: list[str], subdir: str = "Resale Flat Prices"):
+    manifest = load_manifest(get_manifest_path(subdir))
+    store_manifest_path = get_store_manifest_path(subdir)
+    converted = load_manifest(store_manifest_path)
+    for month in months:
+        if month in manifest:
+            converted[month] = manifest[month]["fingerprint"]
+    save_manifest(store_manifest_path, converted)
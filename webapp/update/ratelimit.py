@@ -0,0 +1,79 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# used for hosts that were never configured
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 5.0  # requests per second
+
+
+class TokenBucket:
+    """
+    Allow `rate` acquisitions per second on average, with bursts of up to
+    `burst`. acquire() blocks until a token is free; safe to share across threads.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimit:
+    """At most `concurrency` requests in flight and `rate` requests/s to one host."""
+
+    def __init__(
+        self, concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE
+    ):
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst=concurrency)
+
+    @contextmanager
+    def slot(self):
+        with self.semaphore:
+            self.bucket.acquire()
+            yield
+
+
+_host_limits: dict[str, HostLimit] = {}
+_lock = threading.Lock()
+
+
+def configure_host(
+    host: str, concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE
+):
+    """Set the limits for a host; requests already waiting keep the old ones."""
+    with _lock:
+        _host_limits[host] = HostLimit(concurrency, rate)
+
+
+def get_host_limit(url: str) -> HostLimit:
+    host = urlparse(url).netloc
+    with _lock:
+        if host not in _host_limits:
+            _host_limits[host] = HostLimit()
+        return _host_limits[host]
+
+
+@contextmanager
+def limited(url: str):
+    """Hold a request slot for the host of url for the duration of the block."""
+    with get_host_limit(url).slot():
+        yield
@@ -0,0 +1,92 @@
+import time
+
+import polars as pl
+
+from webapp.read import scan_dataframe
+from webapp.rollup import (
+    ROLLUP_FILE,
+    ROLLUP_KEYS,
+    ROLLUP_LEVELS,
+    SKETCH_FILE,
+    SKETCH_METRICS,
+    to_sketch_bin,
+)
+from webapp.utils import BUILD_ID, get_project_root
+
+
+def build_rollup(subdir: str = "Resale Flat Prices"):
+    """
+    Materialise the quarter x town x flat_type x lease category x storey band
+    rollup read by the Resale Trends page, plus its coarser ROLLUP_LEVELS.
+
+    Each cell keeps the months and remaining lease years it spans so the
+    reader can tell whether a sidebar selection covers it completely. Columns
+    a level does not group by are null.
+    """
+    lf = scan_dataframe(subdir=subdir)
+    levels = [
+        lf.group_by(keys)
+        .agg(
+            pl.col("month").min().alias("first_month"),
+            pl.col("month").max().alias("last_month"),
+            pl.col("remaining_lease_years").min().alias("lease_years_min"),
+            pl.col("remaining_lease_years").max().alias("lease_years_max"),
+            pl.len().alias("txn_count"),
+            pl.col("resale_price").cast(pl.Float64).sum().alias("resale_price_sum"),
+            pl.min("resale_price").alias("resale_price_min"),
+            pl.max("resale_price").alias("resale_price_max"),
+            pl.col("psf").cast(pl.Float64).sum().alias("psf_sum"),
+            pl.min("psf").alias("psf_min"),
+            pl.max("psf").alias("psf_max"),
+        )
+        .sort(keys)
+        .with_columns(pl.lit(level, pl.UInt8).alias("level"))
+        for level, keys in enumerate(ROLLUP_LEVELS)
+    ]
+    cube = (
+        pl.concat(pl.collect_all(levels), how="diagonal")
+        .select(pl.col(["level"] + ROLLUP_KEYS), pl.exclude(["level"] + ROLLUP_KEYS))
+        .with_row_index("cell")
+    )
+
+    # the sketch refers to cells by number, so both files carry this build's
+    # id and the app only pairs files with the same one
+    metadata = {BUILD_ID: str(time.time_ns())}
+    sketch = build_sketch(cube, subdir)
+    data_dir = get_project_root() / "data" / subdir
+    for frame, file_name, label in (
+        (sketch, SKETCH_FILE, "sketch bins"),
+        (cube, ROLLUP_FILE, "rollup cells"),
+    ):
+        # swap in complete files; the app may be reading the previous ones
+        path = data_dir / file_name
+        tmp_path = path.with_suffix(".tmp")
+        frame.write_parquet(tmp_path, metadata=metadata)
+        tmp_path.replace(path)
+        print(f"Wrote {frame.height} {label} to {path}")
+
+
+def build_sketch(
+    cube: pl.DataFrame, subdir: str = "Resale Flat Prices"
+) -> pl.DataFrame:
+    """Count every cell's resale_price and psf values into logarithmic bins."""
+    values = (
+        scan_dataframe(subdir=subdir)
+        .select(ROLLUP_KEYS + SKETCH_METRICS)
+        .unpivot(SKETCH_METRICS, index=ROLLUP_KEYS, variable_name="metric")
+        .with_columns(to_sketch_bin(pl.col("value")).alias("bin"))
+    )
+    levels = [
+        values.join(
+            cube.lazy().filter(pl.col("level") == level).select(["cell"] + keys),
+            on=keys,
+        )
+        .group_by("cell", "metric", "bin")
+        .agg(pl.len().alias("count"))
+        for level, keys in enumerate(ROLLUP_LEVELS)
+    ]
+    return pl.concat(pl.collect_all(levels)).sort("cell", "metric", "bin")
+
+
+if __name__ == "__main__":
+    build_rollup()
@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6_371_008.8  # metres, mean radius
+# Singapore spans about 1.15 to 1.48 degrees north, so an equirectangular
+# projection scaled at 1.35 is within 0.01% of great-circle distances there
+ORIGIN_LAT = 1.35
+
+
+def to_metres(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """Project WGS84 degrees to (x, y) metres for distance computations."""
+    scale = math.radians(1) * EARTH_RADIUS
+    return np.column_stack(
+        [
+            np.asarray(longitude, np.float64)
+            * scale
+            * math.cos(math.radians(ORIGIN_LAT)),
+            np.asarray(latitude, np.float64) * scale,
+        ]
+    )
+
+
+def get_ring(radius: int) -> list[tuple[int, int]]:
+    """Cell offsets at Chebyshev distance radius from a cell."""
+    if radius == 0:
+        return [(0, 0)]
+    return [
+        (di, dj)
+        for di in range(-radius, radius + 1)
+        for dj in range(-radius, radius + 1)
+        if max(abs(di), abs(dj)) == radius
+    ]
+
+
+class GridIndex:
+    """
+    Points bucketed into square cells of `cell` metres and sorted by cell, so
+    the points of any cell are one searchsorted slice. Queries run for all
+    query points at once, one neighbouring cell offset at a time.
+    """
+
+    def __init__(self, xy: np.ndarray, cell: float = 250.0):
+        self.cell = cell
+        codes = self.encode(self.get_cells(xy))
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.xy = xy[order]
+        self.order = order
+
+    def get_cells(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor(xy / self.cell).astype(np.int64)
+
+    @staticmethod
+    def encode(cells: np.ndarray) -> np.ndarray:
+        # unique while cell numbers stay within +-2**31
+        return (cells[:, 0] << 32) + cells[:, 1]
+
+    def get_pairs(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(query, point) positions of every point in cells[query], for all queries."""
+        codes = self.encode(cells)
+        start = np.searchsorted(self.codes, codes, "left")
+        counts = np.searchsorted(self.codes, codes, "right") - start
+        query = np.repeat(np.arange(len(cells)), counts)
+        first = np.repeat(start - (np.cumsum(counts) - counts), counts)
+        return query, first + np.arange(counts.sum())
+
+    def count_within(self, xy: np.ndarray, radius: float) -> np.ndarray:
+        """Number of points within radius metres of each query point."""
+        cells = self.get_cells(xy)
+        reach = math.ceil(radius / self.cell)
+        counts = np.zeros(len(xy), np.int64)
+        for ring in range(reach + 1):
+            for offset in get_ring(ring):
+                query, point = self.get_pairs(cells + offset)
+                dist2 = ((xy[query] - self.xy[point]) ** 2).sum(axis=1)
+                counts += np.bincount(query[dist2 <= radius**2], minlength=len(xy))
+        return counts
+
+    def nearest(self, xy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Distance in metres to, and index of, the nearest point for each query.
+
+        Rings of cells are searched outwards. After rings 0..r every unseen
+        point is at least r cells away, so a query is done once its best
+        distance is within that.
+        """
+        best = np.full(len(xy), np.inf)
+        best_index = np.full(len(xy), -1)
+        if not len(self.xy):
+            return best, best_index
+
+        cells = self.get_cells(xy)
+        active = np.arange(len(xy))
+        ring = 0
+        while len(active):
+            for offset in get_ring(ring):
+                query, point = self.get_pairs(cells[active] + offset)
+                if not len(query):
+                    continue
+                query = active[query]
+                dist2 = ((xy[query] - self.xy[point]) ** 2).sum(axis=1)
+                # the closest pair of each query in this cell
+                order = np.lexsort((dist2, query))
+                query, point, dist2 = query[order], point[order], dist2[order]
+                first = np.r_[True, query[1:] != query[:-1]]
+                query, point, dist = query[first], point[first], np.sqrt(dist2[first])
+                closer = dist < best[query]
+                best[query[closer]] = dist[closer]
+                best_index[query[closer]] = self.order[point[closer]]
+            active = active[best[active] > ring * self.cell]
+            ring += 1
+        return best, best_index
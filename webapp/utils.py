@@ -1,5 +1,12 @@
+import functools
 from pathlib import Path
 
+import polars as pl
+import streamlit as st
+
+# parquet metadata key of the id shared by files built together
+BUILD_ID = "build_id"
+
 
 def get_project_root() -> Path:
     cloud_path = Path("/mount/src/hdb-kaki")
@@ -9,6 +16,52 @@ def get_project_root() -> Path:
     return Path(__file__).parent.parent
 
 
+def get_file_version(path: Path) -> int | None:
+    """
+    Modification time of a file built by the ETL, or None if it is missing.
+    Passed to the cached loaders so a rebuilt file is read again.
+    """
+    return path.stat().st_mtime_ns if path.exists() else None
+
+
+def get_build_id(source) -> str | None:
+    """
+    The build id the ETL wrote into the metadata of a parquet file (a path or
+    an open file), or None if there is none. Files built together share one.
+    """
+    if isinstance(source, Path) and not source.exists():
+        return None
+    return pl.read_parquet_metadata(source).get(BUILD_ID)
+
+
+@st.cache_resource(ttl=3600, max_entries=8)
+def load_parquet(path: Path, version: int | str = None) -> pl.DataFrame:
+    """
+    Read a parquet file built by the ETL, or an empty frame if it is missing.
+
+    version is the file's get_file_version, so the file is read again after a
+    rebuild, or for files built together, their get_build_id. A file that no
+    longer has that build id then comes back empty rather than from another
+    build. The frame is shared, so callers must not modify it in place.
+    """
+    if version is None:
+        return pl.DataFrame()
+    # one open file, so the build id and the rows come from the same inode
+    with open(path, "rb") as file:
+        if isinstance(version, str) and get_build_id(file) != version:
+            return pl.DataFrame()
+        file.seek(0)
+        return pl.read_parquet(file)
+
+
+def get_dataset_filename(name: str, file_format: str) -> str:
+    """The file name a data.gov.sg dataset is saved under."""
+    file_name = f"{name}.{file_format}"
+    return "".join(
+        c for c in file_name if c.isalnum() or c in (" ", ".", "_", "-")
+    ).strip()
+
+
 def pastel_colors(n: int):
     import colorsys
 
@@ -121,3 +174,58 @@ def apply_default_theme(fig):
         ),
     )
     return fig
+
+
+@functools.lru_cache
+def get_color_lut(colorscale: str = "Portland", alpha: int = 180, size: int = 256):
+    """A plotly colorscale sampled into a (size, 4) array of RGBA bytes."""
+    import numpy as np
+    import plotly.colors as pc
+
+    samples = pc.sample_colorscale(colorscale, np.linspace(0, 1, size))
+    lut = np.full((size, 4), alpha, dtype=np.uint8)
+    lut[:, :3] = [pc.unlabel_rgb(color) for color in samples]
+    return lut
+
+
+def map_colors(values, vmin: float, vmax: float, colorscale: str = "Portland"):
+    """RGBA colours of values scaled from vmin to vmax, via get_color_lut."""
+    import numpy as np
+
+    lut = get_color_lut(colorscale)
+    if vmax == vmin:
+        scaled = np.full(len(values), 0.5)
+    else:
+        scaled = (np.asarray(values, np.float64) - vmin) / (vmax - vmin)
+    index = np.rint(np.clip(scaled, 0, 1) * (len(lut) - 1)).astype(np.intp)
+    return lut[index]
+
+
+def format_number(expr: pl.Expr, decimals: int = 0) -> pl.Expr:
+    """
+    Format non-negative numbers below 10**15 like f"{x:,.{decimals}f}", as a
+    string column.
+    """
+    scale = 10**decimals
+    scaled = (expr * scale).round().cast(pl.Int64)
+    whole = scaled // scale
+
+    def get_group(power: int) -> pl.Expr:
+        return ((whole // 1000**power) % 1000).cast(pl.Utf8).str.zfill(3)
+
+    text = whole.cast(pl.Utf8)
+    for power in range(1, 5):
+        groups = [get_group(p) for p in range(power - 1, -1, -1)]
+        text = (
+            pl.when(whole >= 1000**power)
+            .then(
+                pl.concat_str(
+                    (whole // 1000**power).cast(pl.Utf8), *groups, separator=","
+                )
+            )
+            .otherwise(text)
+        )
+    if not decimals:
+        return text
+    fraction = (scaled % scale).cast(pl.Utf8).str.zfill(decimals)
+    return pl.concat_str(text, pl.lit("."), fraction)